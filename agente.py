@@ -8,16 +8,22 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 import zipfile
-import pandas as pd
-from typing import List, Dict, Any
-import google.generativeai as genai
+from typing import List, Dict, Any, Optional
 import logging
 import threading
 import time
 import base64
+import hashlib
+import unicodedata
+import atexit
+from collections import OrderedDict
 from dotenv import load_dotenv
 load_dotenv()
-from call_gemini_lang_chain import call_gemini
+from llm_gateway import LLMUnavailableError, gateway_from_env
+from llm_provider import LLMProvider, default_provider
+from http_cache import encode_variants, json_response, make_etag, not_modified, not_modified_response
+from query_log import QueryRecorder
+from sessions import SessionContext, SessionStore
 # Suprimir warnings
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -29,6 +35,20 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+# Provedor e gateway únicos para todas as chamadas ao modelo, pois a quota é por chave de API
+llm_provider = default_provider()
+llm_gateway = gateway_from_env(llm_provider.default_rate_per_minute)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+# Diretório do snapshot do estado pronto ("" desliga) e intervalo mínimo entre gravações dos caches
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".snapshot")
+SNAPSHOT_CACHE_INTERVAL = float(os.getenv("SNAPSHOT_CACHE_INTERVAL", "60"))
+# Grava as perguntas atendidas em JSONL para replay (python replay.py <arquivo>)
+query_recorder = QueryRecorder(os.environ["QUERY_LOG_PATH"]) if os.getenv("QUERY_LOG_PATH") else None
+# Quantos itens cada ranking local lista quando a pergunta não diz ("top 5", "os 3 primeiros")
+LIMITES_PADRAO = {"fornecedor_montante": 1, "produto_quantidade": 1, "estados": 5, "maiores_notas": 10}
+# Porta da API (o replay.py --spawn-backend usa a porta da --url)
+API_PORT = int(os.getenv("API_PORT", "5000"))
+
 """
  Alquimistas Digitais - Análise Inteligente de Notas Fiscais
 
@@ -36,37 +56,95 @@ CORS(app)
  oferecidas pela Google, permitindo a construção de projetos simples e protótipos como esse.
 
 """
-class SimpleGemini:
-   
-    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-preview-04-17"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-    
-    def generate(self, prompt: str) -> str:
-        """Gera resposta diretamente"""
+class SingleFlight:
+
+    """
+    Deduplica chamadas concorrentes com a mesma chave: a primeira thread
+    executa a função e as demais aguardam e recebem o mesmo resultado.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+            self.waiters = 0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, "SingleFlight._Call"] = {}
+
+    def do(self, key, fn):
+        """Executa fn() uma única vez por chave em voo; retorna (resultado, compartilhado)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
         try:
-            response = self.model.generate_content(prompt)
-            return response.text if response.text else "Resposta vazia do modelo"
-        except Exception as e:
-            logger.error(f"Erro ao chamar Gemini: {e}")
-            return f"Erro: {str(e)}"
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+            if call.waiters:
+                logger.info(f"Chamada compartilhada com {call.waiters} requisições simultâneas")
+
+def normalize_question(question: str) -> str:
+    """Normaliza a pergunta para comparação (caixa, espaços e pontuação final)"""
+    question = unicodedata.normalize("NFC", question).casefold()
+    return " ".join(question.split()).rstrip("?!. ")
 
 class NFAnalysisAgent:
 
     """Agente simplificado de IA para análise de Notas Fiscais"""
     
-    def __init__(self, gemini_api_key: str):
-        self.gemini_api_key = gemini_api_key
-        self.gemini = SimpleGemini(api_key=gemini_api_key)
+    def __init__(self, llm: LLMProvider):
+        self.llm = llm
         self.df_cabecalho = None
         self.df_itens = None
         self.df_combined = None
+        self.data_version = None
         self.is_ready = False
+        self.load_stage = "pending"
+        self.load_percent = 0
+        self._aggregates: Dict[str, Any] = {}
+        self.rollups: Dict[str, Dict[str, Any]] = {}
+        self._time_index = None
+        self.validation_report: Dict[str, Any] = {}
+        self._llm_flight = SingleFlight()
+        self._answer_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._answer_cache_lock = threading.Lock()
+        self.sessions = SessionStore()
+        self.snapshot_dir = None
+        self._caches_saved_at = time.monotonic()
+        self.response_version = None
+        self.summary_response = None
+
+    def _set_progress(self, stage: str, percent: int):
+        """Atualiza a etapa de carregamento exibida em /api/health"""
+        self.load_stage = stage
+        self.load_percent = percent
+        logger.info(f"Carregamento: {stage} ({percent}%)")
 
-    
     def extract_zip_files(self, zip_path: str, extract_to: str = "./data/"):
         """Extrai arquivos CSV do ZIP"""
         try:
+            self._set_progress("extracting", 0)
             os.makedirs(extract_to, exist_ok=True)
             
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -93,32 +171,109 @@ class NFAnalysisAgent:
     def load_csv_files(self, cabecalho_path: str, itens_path: str):
         
         try:
-            self.df_cabecalho = pd.read_csv(cabecalho_path, encoding='utf-8')
-            self.df_itens = pd.read_csv(itens_path, encoding='utf-8')
+            self._set_progress("parsing", 20)
+
+            # pandas é importado aqui para não atrasar a subida do servidor
+            import pandas as pd
+            # Chaves e documentos como texto, preservando zeros à esquerda
+            dtypes = {'CHAVE DE ACESSO': str, 'CPF/CNPJ Emitente': str}
+            self.df_cabecalho = pd.read_csv(cabecalho_path, encoding='utf-8', dtype=dtypes)
+            self.df_itens = pd.read_csv(itens_path, encoding='utf-8', dtype=dtypes)
             
             # Limpar nomes das colunas
             self.df_cabecalho.columns = self.df_cabecalho.columns.str.strip()
             self.df_itens.columns = self.df_itens.columns.str.strip()
+
+            # Datas de emissão como timestamp (valores inválidos viram NaT)
+            datas_originais = self.df_cabecalho['DATA EMISSÃO']
+            self.df_cabecalho['DATA EMISSÃO'] = pd.to_datetime(datas_originais, errors='coerce')
             
             logger.info(f"Cabeçalho carregado: {self.df_cabecalho.shape[0]} registros")
             logger.info(f"Itens carregados: {self.df_itens.shape[0]} registros")
             
-            # Criar DataFrame combinado
+            # Criar DataFrame combinado. As chaves viram códigos inteiros uma
+            # única vez; o merge e a validação reaproveitam os mesmos códigos
+            self._set_progress("merging", 60)
+            from validation import codificar_chaves
+            codigos = codificar_chaves(self.df_cabecalho['CHAVE DE ACESSO'], self.df_itens['CHAVE DE ACESSO'])
             self.df_combined = pd.merge(
-                self.df_cabecalho, 
-                self.df_itens, 
-                on='CHAVE DE ACESSO', 
+                self.df_cabecalho.assign(_codigo_nota=codigos[0]), 
+                self.df_itens.drop(columns='CHAVE DE ACESSO').assign(_codigo_nota=codigos[1]), 
+                on='_codigo_nota', 
                 how='inner',
                 suffixes=('_cab', '_item')
-            )
+            ).drop(columns='_codigo_nota')
             
+            self._set_progress("validating", 70)
+            self._validate(datas_originais, codigos)
+
+            self._set_progress("indexing", 80)
+            self.data_version = self._compute_data_version(cabecalho_path, itens_path)
+            self._build_indexes()
+            self._prepare_responses()
+
+            self._set_progress("ready", 100)
             self.is_ready = True
             return True
             
         except Exception as e:
             logger.error(f"Erro ao carregar CSVs: {e}")
+            self._set_progress("failed", self.load_percent)
             return False
+
+    def _validate(self, datas_originais, codigos=None):
+        """Verifica a consistência entre cabeçalho e itens; falhas aqui não impedem o carregamento"""
+        from validation import validate
+
+        try:
+            self.validation_report = validate(self.df_cabecalho, self.df_itens, datas_originais, codigos)
+            logger.info(f"Validação concluída: {self.validation_report['problemas']} problemas "
+                        f"em {self.validation_report['duracao_ms']} ms")
+        except Exception as e:
+            logger.error(f"Erro na validação dos dados: {e}")
+            self.validation_report = {"error": str(e)}
+
+    def _build_indexes(self):
+        """Pré-calcula os agregados e índices usados pelas respostas locais"""
+        from timeseries import TimeIndex, build_rollups
+
+        self.rollups = build_rollups(self.df_cabecalho)
+        self._time_index = TimeIndex(self.df_cabecalho['DATA EMISSÃO'])
+        self._aggregates = {
+            "fornecedor_montante": self.df_cabecalho.groupby('RAZÃO SOCIAL EMITENTE')['VALOR NOTA FISCAL'].sum().sort_values(ascending=False),
+            "produto_quantidade": self.df_itens.groupby('DESCRIÇÃO DO PRODUTO/SERVIÇO')['QUANTIDADE'].sum().sort_values(ascending=False),
+            "estados": self.df_cabecalho['UF EMITENTE'].value_counts(),
+            "maiores_notas": self.df_cabecalho.nlargest(10, 'VALOR NOTA FISCAL')[['RAZÃO SOCIAL EMITENTE', 'VALOR NOTA FISCAL']],
+        }
     
+    @staticmethod
+    def _compute_data_version(*paths: str) -> str:
+        """Hash do conteúdo dos CSVs, usado para identificar a versão do dataset"""
+        digest = hashlib.sha1()
+        for path in paths:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()[:16]
+
+    def _prepare_responses(self):
+        """Serializa e comprime o resumo uma vez por versão dos dados (servido por /api/summary)"""
+        from snapshot import code_version
+
+        self.response_version = f"{self.data_version}-{code_version()}"
+        summary = self._compute_summary()
+        if "error" in summary:
+            self.summary_response = None
+            return
+        self.summary_response = {
+            "etag": make_etag("summary", self.response_version),
+            "variants": encode_variants(app.json.dumps(summary).encode("utf-8")),
+        }
+
+    def query_etag(self, question: str) -> str:
+        """ETag de uma resposta cacheável: muda com a versão dos dados e com o LLM (provedor, modelo, temperatura)"""
+        return make_etag("query", self.response_version, self.llm.identity, normalize_question(question))
+
     def get_data_summary(self) -> str:
 
         """Gera resumo dos dados para o contexto da LLM"""
@@ -136,13 +291,13 @@ class NFAnalysisAgent:
             valor_medio = self.df_cabecalho['VALOR NOTA FISCAL'].mean()
             
             # Top fornecedores por montante
-            top_fornecedores = self.df_cabecalho.groupby('RAZÃO SOCIAL EMITENTE')['VALOR NOTA FISCAL'].sum().sort_values(ascending=False).head(10)
+            top_fornecedores = self._aggregates["fornecedor_montante"].head(10)
             
             # Top produtos por quantidade
-            top_produtos = self.df_itens.groupby('DESCRIÇÃO DO PRODUTO/SERVIÇO')['QUANTIDADE'].sum().sort_values(ascending=False).head(10)
+            top_produtos = self._aggregates["produto_quantidade"].head(10)
             
             # Top estados
-            top_estados = self.df_cabecalho['UF EMITENTE'].value_counts().head(5)
+            top_estados = self._aggregates["estados"].head(5)
             
             summary = f"""
             DADOS DAS NOTAS FISCAIS:
@@ -172,6 +327,9 @@ class NFAnalysisAgent:
         if not self.is_ready or self.df_cabecalho is None:
             return {"error": "Dados não carregados"}
         
+        return self._compute_summary()
+
+    def _compute_summary(self) -> dict:
         try:
             # Estatísticas financeiras
             valor_total = float(self.df_cabecalho['VALOR NOTA FISCAL'].sum())
@@ -206,67 +364,524 @@ class NFAnalysisAgent:
     
     def execute_pandas_analysis(self, question: str) -> str:
         """Executa análise direta com pandas baseada na pergunta"""
+        intent = self.resolve_intent(question)
+        if intent is None:
+            return None  # Deixa para a LLM processar
+        return self._run_intent(intent)[1]
+
+    def resolve_intent(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Identifica perguntas que o pandas responde localmente: intenção, filtros
+        (UF e período) e parâmetros. None deixa a pergunta para a LLM.
+        """
+        from timeseries import PeriodoInvalido, detectar_frequencia, detectar_limite, pede_totais
+
         try:
             question_lower = question.lower()
-            
-            if "maior montante" in question_lower or ("fornecedor" in question_lower and "maior" in question_lower):
-                fornecedor_montante = self.df_cabecalho.groupby('RAZÃO SOCIAL EMITENTE')['VALOR NOTA FISCAL'].sum().sort_values(ascending=False)
-                maior_fornecedor = fornecedor_montante.index[0]
-                maior_valor = fornecedor_montante.iloc[0]
-                return f"🏆 O fornecedor com maior montante é: **{maior_fornecedor}** com R$ {maior_valor:,.2f}"
-            
+            filtros = self._extract_filters(question)
+            intent = {"intent": None, "filtros": filtros, "limite": detectar_limite(question)}
+
+            # Perguntas temporais são respondidas pelos rollups e pelo índice de datas
+            frequencia = detectar_frequencia(question) if self._time_index is not None else None
+            if frequencia:
+                quebra = None
+                if "estado" in question_lower or " uf" in f" {question_lower}":
+                    quebra = "uf"
+                elif "fornecedor" in question_lower:
+                    quebra = "fornecedor"
+                intent.update(intent="serie_temporal", frequencia=frequencia, quebra=quebra)
+
+            elif "maior montante" in question_lower or ("fornecedor" in question_lower and "maior" in question_lower):
+                intent["intent"] = "fornecedor_montante"
+
             elif "produto" in question_lower and "mais vendido" in question_lower:
-                produto_vendido = self.df_itens.groupby('DESCRIÇÃO DO PRODUTO/SERVIÇO')['QUANTIDADE'].sum().sort_values(ascending=False)
-                produto_top = produto_vendido.index[0]
-                quantidade = produto_vendido.iloc[0]
-                return f"📦 O produto mais vendido é: **{produto_top}** com {quantidade:.0f} unidades"
-            
+                intent["intent"] = "produto_quantidade"
+
             elif "estado" in question_lower or "uf" in question_lower:
-                estados_emitente = self.df_cabecalho['UF EMITENTE'].value_counts().head(5)
-                result = "📍 Estados com mais emissões:\n"
-                for estado, count in estados_emitente.items():
-                    result += f"• {estado}: {count} notas\n"
-                return result.strip()
-            
+                intent["intent"] = "estados"
+
             elif "maiores notas" in question_lower or "maiores valores" in question_lower:
-                maiores_notas = self.df_cabecalho.nlargest(10, 'VALOR NOTA FISCAL')[['RAZÃO SOCIAL EMITENTE', 'VALOR NOTA FISCAL']]
-                result = "💰 As 10 maiores notas fiscais:\n"
-                for idx, row in maiores_notas.iterrows():
-                    result += f"• {row['RAZÃO SOCIAL EMITENTE']}: R$ {row['VALOR NOTA FISCAL']:,.2f}\n"
-                return result.strip()
-            
-            else:
-                return None  # Deixa para a LLM processar
-                
+                intent["intent"] = "maiores_notas"
+
+            elif filtros["periodo"] and pede_totais(question):
+                intent["intent"] = "periodo"
+
+            return intent if intent["intent"] else None
+
+        except PeriodoInvalido as e:
+            # Sem o período certo qualquer resposta local sairia errada
+            logger.info(f"Período não interpretado, pergunta vai para a LLM: {e}")
+            return None
         except Exception as e:
             logger.error(f"Erro na análise pandas: {e}")
             return None
-    
-    def query(self, question: str) -> str:
 
+    def _extract_filters(self, question: str) -> Dict[str, Any]:
+        """UF e período citados; datas que não dá para interpretar levantam PeriodoInvalido"""
+        from timeseries import detectar_periodo, detectar_uf
+
+        periodo = None
+        if self._time_index is not None and self._time_index.fim is not None:
+            periodo = detectar_periodo(question, self._time_index.fim.year)
+        return {"uf": detectar_uf(question), "periodo": periodo}
+
+    def _filtered_notes(self, filtros: Dict[str, Any]):
+        """Notas que atendem aos filtros, ou None sem filtros (usa os agregados pré-calculados)"""
+        uf, periodo = filtros.get("uf"), filtros.get("periodo")
+        if not uf and not periodo:
+            return None
+        notas = self.df_cabecalho
+        if periodo:
+            notas = notas.iloc[self._time_index.slice(*periodo)]
+        if uf:
+            notas = notas[notas['UF EMITENTE'] == uf]
+        return notas
+
+    def _filtered_items(self, notas):
+        return self.df_itens[self.df_itens['CHAVE DE ACESSO'].isin(notas['CHAVE DE ACESSO'])]
+
+    def _run_intent(self, intent: Dict[str, Any]):
+        """Calcula e formata a intenção; devolve (resultado intermediário, resposta)"""
+        try:
+            resultado = self._compute_intent(intent)
+            return resultado, self._format_intent(intent, resultado)
+        except Exception as e:
+            logger.error(f"Erro na análise pandas: {e}")
+            return None, None
+
+    def _compute_intent(self, intent: Dict[str, Any]):
+        """Resultado intermediário (Series/DataFrame) da intenção, com os filtros aplicados"""
+        nome = intent["intent"]
+        if nome == "serie_temporal":
+            return self._compute_time_series(intent)
+
+        notas = self._filtered_notes(intent["filtros"])
+        if nome == "periodo":
+            return notas
+
+        if nome == "fornecedor_montante":
+            if notas is None:
+                return self._aggregates["fornecedor_montante"]
+            return notas.groupby('RAZÃO SOCIAL EMITENTE')['VALOR NOTA FISCAL'].sum().sort_values(ascending=False)
+
+        if nome == "produto_quantidade":
+            if notas is None:
+                return self._aggregates["produto_quantidade"]
+            itens = self._filtered_items(notas)
+            return itens.groupby('DESCRIÇÃO DO PRODUTO/SERVIÇO')['QUANTIDADE'].sum().sort_values(ascending=False)
+
+        if nome == "estados":
+            return self._aggregates["estados"] if notas is None else notas['UF EMITENTE'].value_counts()
+
+        if nome == "maiores_notas":
+            limite = max(intent.get("limite") or 0, LIMITES_PADRAO["maiores_notas"])
+            if notas is None and limite == LIMITES_PADRAO["maiores_notas"]:
+                return self._aggregates["maiores_notas"]
+            notas = self.df_cabecalho if notas is None else notas
+            return notas.nlargest(limite, 'VALOR NOTA FISCAL')[['RAZÃO SOCIAL EMITENTE', 'VALOR NOTA FISCAL']]
+
+        raise ValueError(f"Intenção desconhecida: {nome}")
+
+    def _compute_time_series(self, intent: Dict[str, Any]):
+        """Rollup recortado pelo período (total e quebra); com filtro de UF, só a série da UF"""
+        from timeseries import recortar_rollup
+
+        filtros = intent["filtros"]
+        inicio, fim = filtros["periodo"] or (None, None)
+        rollups = self.rollups[intent["frequencia"]]
+        quebra = intent.get("quebra")
+
+        if filtros.get("uf"):
+            # A quebra por UF ou fornecedor não se aplica à série de uma única UF
+            try:
+                total = rollups["uf"].xs(filtros["uf"], level=1)
+            except KeyError:
+                total = rollups["total"].iloc[:0]
+            quebra = None
+        else:
+            total = rollups["total"]
+
+        total = recortar_rollup(total, inicio, fim)
+        detalhes = recortar_rollup(rollups[quebra], inicio, fim) if quebra else None
+        return total, detalhes
+
+    @staticmethod
+    def _describe_filters(filtros: Dict[str, Any]) -> str:
+        from timeseries import formatar_intervalo
+
+        partes = []
+        if filtros.get("uf"):
+            partes.append(filtros["uf"])
+        if filtros.get("periodo"):
+            partes.append(formatar_intervalo(*filtros["periodo"]).lower())
+        return f" ({', '.join(partes)})" if partes else ""
+
+    def _format_intent(self, intent: Dict[str, Any], resultado) -> str:
+        nome = intent["intent"]
+        if nome == "serie_temporal":
+            return self._format_time_series(intent, *resultado)
+        if nome == "periodo":
+            return self._format_period(intent["filtros"], resultado)
+
+        sufixo = self._describe_filters(intent["filtros"])
+        if resultado.empty:
+            return f"🔎 Nenhuma nota fiscal encontrada{sufixo}."
+        limite = intent.get("limite") or LIMITES_PADRAO[nome]
+
+        if nome == "fornecedor_montante":
+            if limite == 1:
+                return f"🏆 O fornecedor com maior montante{sufixo} é: **{resultado.index[0]}** com R$ {resultado.iloc[0]:,.2f}"
+            result = f"🏆 Os {limite} fornecedores com maior montante{sufixo}:\n"
+            for fornecedor, valor in resultado.head(limite).items():
+                result += f"• {fornecedor}: R$ {valor:,.2f}\n"
+            return result.strip()
+
+        if nome == "produto_quantidade":
+            if limite == 1:
+                return f"📦 O produto mais vendido{sufixo} é: **{resultado.index[0]}** com {resultado.iloc[0]:.0f} unidades"
+            result = f"📦 Os {limite} produtos mais vendidos{sufixo}:\n"
+            for produto, quantidade in resultado.head(limite).items():
+                result += f"• {produto}: {quantidade:.0f} unidades\n"
+            return result.strip()
+
+        if nome == "estados":
+            result = f"📍 Estados com mais emissões{sufixo}:\n"
+            for estado, count in resultado.head(limite).items():
+                result += f"• {estado}: {count} notas\n"
+            return result.strip()
+
+        titulo = "A maior nota fiscal" if limite == 1 else f"As {limite} maiores notas fiscais"
+        result = f"💰 {titulo}{sufixo}:\n"
+        for idx, row in resultado.head(limite).iterrows():
+            result += f"• {row['RAZÃO SOCIAL EMITENTE']}: R$ {row['VALOR NOTA FISCAL']:,.2f}\n"
+        return result.strip()
+
+    def _format_time_series(self, intent: Dict[str, Any], total, detalhes) -> str:
+        from timeseries import NOMES_FREQUENCIA, formatar_periodo
+
+        frequencia = intent["frequencia"]
+        sufixo = self._describe_filters(intent["filtros"])
+        if total.empty:
+            return f"📅 Nenhuma nota emitida no período{sufixo}."
+
+        titulo = f"📅 Notas emitidas por {NOMES_FREQUENCIA[frequencia]}{sufixo}"
+        if len(total) > 31:
+            total = total.nlargest(10, "notas").sort_index()
+            titulo += " — os 10 períodos com mais notas"
+        result = titulo + ":\n"
+
+        for inicio_periodo, row in total.iterrows():
+            result += f"• {formatar_periodo(inicio_periodo, frequencia)}: {int(row['notas'])} notas — R$ {row['valor']:,.2f}\n"
+            if detalhes is not None:
+                top = detalhes.xs(inicio_periodo, level=0).nlargest(3, "valor")
+                for nome, linha in top.iterrows():
+                    result += f"   ◦ {nome}: {int(linha['notas'])} notas — R$ {linha['valor']:,.2f}\n"
+        return result.strip()
+
+    def _format_period(self, filtros: Dict[str, Any], notas) -> str:
+        from timeseries import formatar_intervalo
+
+        descricao = formatar_intervalo(*filtros["periodo"])
+        if filtros.get("uf"):
+            descricao += f" ({filtros['uf']})"
+        if notas.empty:
+            return f"🗓️ {descricao}: nenhuma nota fiscal emitida."
+
+        result = f"🗓️ {descricao}: **{len(notas)} notas** somando R$ {notas['VALOR NOTA FISCAL'].sum():,.2f}\n"
+        if not filtros.get("uf"):
+            result += "Estados com mais emissões:\n"
+            for estado, count in notas['UF EMITENTE'].value_counts().head(3).items():
+                result += f"• {estado}: {count} notas\n"
+        result += "Fornecedores com maior montante:\n"
+        fornecedores = notas.groupby('RAZÃO SOCIAL EMITENTE')['VALOR NOTA FISCAL'].sum().nlargest(3)
+        for fornecedor, valor in fornecedores.items():
+            result += f"• {fornecedor}: R$ {valor:,.2f}\n"
+        return result.strip()
+
+    def _get_cached_answer(self, normalized: str, allow_stale: bool = False):
         """
-        Processa uma pergunta usando abordagem híbrida, pois perguntas
-        mais simples podem ser resolvidas diretamente com pandas economizando tokens
-        de modelos, que mesmo gratuítos são limitados.
+        Resposta já obtida para a pergunta (apenas da versão atual, salvo allow_stale),
+        como (resposta, origem), com origem "pandas" ou "llm"
+        """
+        with self._answer_cache_lock:
+            entry = self._answer_cache.get(normalized)
+            if entry is None:
+                return None
+            version, resposta, origem, _ = entry
+            if version != self.data_version and not allow_stale:
+                return None
+            self._answer_cache.move_to_end(normalized)
+            return resposta, origem
+
+    def _store_answer(self, normalized: str, resposta: str, origem: str):
+        with self._answer_cache_lock:
+            self._answer_cache[normalized] = (self.data_version, resposta, origem, None)
+            self._answer_cache.move_to_end(normalized)
+            while len(self._answer_cache) > ANSWER_CACHE_SIZE:
+                self._answer_cache.popitem(last=False)
+        self._maybe_save_caches()
+
+    def cached_response_body(self, question: str, result: Dict[str, Any], build) -> Dict[str, bytes]:
+        """
+        Variantes codificadas do corpo de uma resposta vinda do cache. Ficam
+        guardadas junto da resposta, então repetições da mesma pergunta não
+        serializam nem comprimem o corpo de novo.
+        """
+        normalized = normalize_question(question)
+        with self._answer_cache_lock:
+            entry = self._answer_cache.get(normalized)
+            if entry is not None and entry[3] is not None and entry[3][0] == question:
+                return entry[3][1]
+
+        variants = build()
+        with self._answer_cache_lock:
+            entry = self._answer_cache.get(normalized)
+            if entry is not None and entry[1] == result["response"]:
+                self._answer_cache[normalized] = (*entry[:3], (question, variants))
+        return variants
+
+    def export_answer_cache(self) -> List[tuple]:
+        with self._answer_cache_lock:
+            # Os corpos já codificados não vão para o snapshot
+            return [(normalized, *entry[:3]) for normalized, entry in self._answer_cache.items()]
+
+    def import_answer_cache(self, entries: List[tuple], llm_identity: Optional[str] = None):
+        """
+        Restaura respostas salvas. As do LLM só voltam se provedor, modelo e
+        temperatura forem os mesmos da gravação; as locais (pandas) sempre voltam.
+        """
+        same_llm = llm_identity == self.llm.identity
+        if not same_llm:
+            logger.info(f"LLM mudou ({llm_identity} -> {self.llm.identity}); respostas do LLM salvas descartadas")
+        with self._answer_cache_lock:
+            for normalized, *entry in entries[-ANSWER_CACHE_SIZE:]:
+                if entry[2] == "llm" and not same_llm:
+                    continue
+                self._answer_cache[normalized] = (*entry, None)
+
+    def load_snapshot(self, directory: str, key: Dict[str, str]) -> bool:
+        """Tenta restaurar o estado pronto de um snapshot compatível"""
+        from snapshot import load_snapshot
+
+        try:
+            self._set_progress("restoring", 10)
+            if not load_snapshot(self, directory, key):
+                return False
+        except Exception as e:
+            logger.error(f"Erro ao restaurar snapshot, fazendo carregamento completo: {e}")
+            return False
+
+        self.snapshot_dir = directory
+        self._prepare_responses()
+        self._set_progress("ready", 100)
+        self.is_ready = True
+        return True
+
+    def save_snapshot(self, directory: str, key: Dict[str, str]):
+        """Grava o estado pronto para acelerar o próximo reinício"""
+        from snapshot import save_snapshot
+
+        try:
+            save_snapshot(self, directory, key)
+            self.snapshot_dir = directory
+        except Exception as e:
+            logger.error(f"Erro ao gravar snapshot: {e}")
+
+    def save_caches(self):
+        """Grava os caches de respostas e payload no snapshot atual"""
+        from snapshot import save_caches
+
+        if not self.snapshot_dir:
+            return
+        try:
+            save_caches(self, self.snapshot_dir)
+            self._caches_saved_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Erro ao gravar caches do snapshot: {e}")
+
+    def _maybe_save_caches(self):
+        if self.snapshot_dir and time.monotonic() - self._caches_saved_at >= SNAPSHOT_CACHE_INTERVAL:
+            self._caches_saved_at = time.monotonic()
+            threading.Thread(target=self.save_caches, daemon=True).start()
+
+    def _fallback_answer(self, normalized: str) -> str:
+        """Resposta quando o LLM está indisponível: cache (mesmo antigo) ou resumo local"""
+        cached = self._get_cached_answer(normalized, allow_stale=True)
+        if cached is not None:
+            return cached[0]
+
+        summary = self.get_summary()
+        if "error" in summary:
+            return "⚠️ O serviço de IA está temporariamente indisponível. Tente novamente em instantes."
+
+        stats = summary["estatisticas_financeiras"]
+        result = "⚠️ O serviço de IA está temporariamente indisponível. Enquanto isso, um resumo local dos dados:\n"
+        result += f"• Total de notas fiscais: {summary['total_notas']:,}\n"
+        result += f"• Total de itens: {summary['total_itens']:,}\n"
+        result += f"• Valor total: R$ {stats['valor_total']:,.2f}\n"
+        result += f"• Valor médio por nota: R$ {stats['valor_medio']:,.2f}\n"
+        result += f"• Período: {summary['periodo']['inicio']} a {summary['periodo']['fim']}"
+        return result
+
+    def answer(self, question: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Responde à pergunta e informa a origem da resposta: "pandas", "llm",
+        "fallback", "error" ou "not_ready". `cached` indica resposta vinda do
+        cache e `cacheable` se ela é fixa para a versão atual dos dados.
+
+        Com `session_id`, o turno é lembrado e perguntas de continuação
+        ("e no Paraná?") reaproveitam a intenção e os filtros do anterior.
         """
 
         if not self.is_ready:
-            return "Agente não está pronto ainda. Aguarde o carregamento dos dados."
+            return {"response": "Agente não está pronto ainda. Aguarde o carregamento dos dados.",
+                    "source": "not_ready", "cached": False, "cacheable": False}
         
         try:
+            contexto = self.sessions.get(session_id) if session_id else None
+            intent = self.resolve_intent(question)
+            if contexto is not None:
+                followup = self._answer_followup(question, intent, contexto, session_id)
+                if followup is not None:
+                    return followup
+
+            normalized = normalize_question(question)
+            cached = self._get_cached_answer(normalized)
+            if cached is not None:
+                resposta, origem = cached
+                self._remember(session_id, intent if origem == "pandas" else None, question, resposta)
+                return {"response": resposta, "source": origem, "cached": True, "cacheable": True}
+
             # Primeiro tenta análise direta com pandas
-            pandas_result = self.execute_pandas_analysis(question)
-            if pandas_result:
-                return pandas_result
-            
-            # Se não conseguiu com pandas, usa a API do Gemini
-            resposta = call_gemini(question)
+            if intent is not None:
+                resultado, pandas_result = self._run_intent(intent)
+                if pandas_result:
+                    self._store_answer(normalized, pandas_result, "pandas")
+                    self._remember(session_id, intent, question, pandas_result, resultado)
+                    return {"response": pandas_result, "source": "pandas", "cached": False, "cacheable": True}
             
-            return f"{resposta.strip()}"
+            # Se não conseguiu com pandas, usa a API do Gemini. Perguntas idênticas
+            # em voo para a mesma versão dos dados compartilham uma única chamada.
+            def ask_llm() -> str:
+                # Roda com a chave em voo: grava a resposta antes de liberá-la e confere
+                # o cache de novo, caso outra chamada tenha terminado depois da consulta acima
+                cached = self._get_cached_answer(normalized)
+                if cached is not None:
+                    return cached[0]
+                resposta = llm_gateway.call(self.llm, question).strip()
+                self._store_answer(normalized, resposta, "llm")
+                return resposta
+
+            key = (self.data_version, normalized)
+            try:
+                resposta, _ = self._llm_flight.do(key, ask_llm)
+            except LLMUnavailableError as e:
+                logger.warning(f"LLM indisponível, usando fallback local: {e}")
+                return {"response": self._fallback_answer(normalized), "source": "fallback",
+                        "cached": False, "cacheable": False}
+
+            self._remember(session_id, None, question, resposta)
+            return {"response": resposta, "source": "llm", "cached": False, "cacheable": True}
             
         except Exception as e:
             logger.error(f"Erro ao processar query: {e}")
-            return f"❌ Erro ao processar pergunta: {str(e)}"
+            return {"response": f"❌ Erro ao processar pergunta: {str(e)}", "source": "error",
+                    "cached": False, "cacheable": False}
+
+    def _remember(self, session_id: Optional[str], intent: Optional[Dict[str, Any]], question: str,
+                  resposta: str, resultado=None):
+        """Guarda o turno como contexto da sessão (intent None = resposta do LLM)"""
+        if session_id:
+            self.sessions.put(session_id, SessionContext(intent, question, resposta, resultado))
+
+    def _answer_followup(self, question: str, intent: Optional[Dict[str, Any]], contexto: SessionContext,
+                         session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Responde a uma continuação do turno anterior. Com intenção local, herda os
+        filtros e recorta o resultado guardado ou recalcula só o necessário; depois
+        de uma resposta do LLM, envia a ele apenas o turno anterior e o recorte
+        filtrado. None quando a pergunta não depende do contexto.
+        """
+        from timeseries import PeriodoInvalido, detectar_limite, eh_continuacao
+
+        try:
+            novos = intent["filtros"] if intent is not None else self._extract_filters(question)
+        except PeriodoInvalido:
+            return None
+        novos = {campo: valor for campo, valor in novos.items() if valor}
+        limite = detectar_limite(question)
+        if not eh_continuacao(question, bool(novos) or limite is not None):
+            return None
+
+        anterior = contexto.intent
+        if anterior is None:
+            if intent is not None:
+                return None
+            return self._answer_llm_followup(question, contexto, novos, session_id)
+
+        filtros = {**anterior["filtros"], **novos}
+        if intent is not None:
+            # Nova intenção na continuação ("e o produto mais vendido?"): herda os filtros
+            if filtros == intent["filtros"]:
+                return None
+            intent = dict(intent, filtros=filtros)
+        elif novos or limite is not None:
+            intent = dict(anterior, filtros=filtros)
+            if limite is not None:
+                intent["limite"] = limite
+        else:
+            return None
+
+        resultado = contexto.result
+        reaproveita = (resultado is not None and intent["intent"] == anterior["intent"]
+                       and intent["intent"] in LIMITES_PADRAO and filtros == anterior["filtros"]
+                       and len(resultado) >= (intent.get("limite") or 0))
+        if reaproveita:
+            resposta = self._format_intent(intent, resultado)
+        else:
+            resultado, resposta = self._run_intent(intent)
+            if not resposta:
+                return None
+
+        self._remember(session_id, intent, question, resposta, resultado)
+        return {"response": resposta, "source": "pandas", "cached": False, "cacheable": False}
+
+    def _answer_llm_followup(self, question: str, contexto: SessionContext, filtros: Dict[str, Any],
+                             session_id: str) -> Dict[str, Any]:
+        """Continuação de uma resposta do LLM: só o turno anterior e, com filtros, o recorte dos dados"""
+        notas = self._filtered_notes(filtros)
+        if notas is not None:
+            anexos = [notas.to_csv(index=False).encode("utf-8"),
+                      self._filtered_items(notas).to_csv(index=False).encode("utf-8")]
+            dados = f"Recorte dos dados anexado ({self._describe_filters(filtros).strip(' ()')})."
+        else:
+            anexos = []
+            dados = self.get_data_summary()
+
+        pergunta = (f"Pergunta anterior: {contexto.question}\n"
+                    f"Resposta anterior: {contexto.answer}\n\n"
+                    f"{dados}\n\n"
+                    f"Nova pergunta (continuação da anterior): {question}")
+        try:
+            resposta = llm_gateway.call(self.llm, pergunta, anexos)
+        except LLMUnavailableError as e:
+            logger.warning(f"LLM indisponível, usando fallback local: {e}")
+            return {"response": self._fallback_answer(normalize_question(question)), "source": "fallback",
+                    "cached": False, "cacheable": False}
+
+        resposta = resposta.strip()
+        self._remember(session_id, None, question, resposta)
+        return {"response": resposta, "source": "llm", "cached": False, "cacheable": False}
+
+    def query(self, question: str, session_id: Optional[str] = None) -> str:
+
+        """
+        Processa uma pergunta usando abordagem híbrida, pois perguntas
+        mais simples podem ser resolvidas diretamente com pandas economizando tokens
+        de modelos, que mesmo gratuítos são limitados.
+        """
+
+        return self.answer(question, session_id)["response"]
 
 # Instância global do agente
 nf_agent = None
@@ -283,9 +898,8 @@ def initialize_agent():
     logger.info("Iniciando carregamento do agente...")
     
     try:
-        # Verificar API key
-        api_key = os.getenv("GOOGLE_API_KEY") 
-        if not api_key:
+        # Verificar API key (o provedor local de testes não precisa)
+        if llm_provider.requires_api_key and not llm_provider.api_key:
             logger.error("GOOGLE_API_KEY não configurada!")
             return
         
@@ -303,27 +917,60 @@ def initialize_agent():
             return
         
         # Inicializar agente
-        nf_agent = NFAnalysisAgent(api_key)
+        agent = NFAnalysisAgent(llm_provider)
+        nf_agent = agent
+        
+        # Reinício rápido: usa o snapshot se ZIP e código não mudaram
+        snapshot_key = None
+        if SNAPSHOT_DIR:
+            from snapshot import snapshot_key as build_snapshot_key
+            snapshot_key = build_snapshot_key(zip_path)
+            if agent.load_snapshot(SNAPSHOT_DIR, snapshot_key):
+                logger.info("Agente restaurado do snapshot!")
+                threading.Thread(target=prewarm_llm, daemon=True).start()
+                return
         
         # Extrair e carregar dados
-        cabecalho_path, itens_path = nf_agent.extract_zip_files(zip_path)
+        cabecalho_path, itens_path = agent.extract_zip_files(zip_path)
         if not cabecalho_path or not itens_path:
             logger.error("Erro ao extrair arquivos do ZIP")
             return
         
-        if not nf_agent.load_csv_files(cabecalho_path, itens_path):
+        if not agent.load_csv_files(cabecalho_path, itens_path):
             logger.error("Erro ao carregar arquivos CSV")
             return
         
         logger.info("Agente carregado com sucesso!")
+
+        if snapshot_key:
+            threading.Thread(target=agent.save_snapshot, args=(SNAPSHOT_DIR, snapshot_key), daemon=True).start()
+
+        # Pré-aquece o SDK do modelo fora do caminho crítico das requisições
+        threading.Thread(target=prewarm_llm, daemon=True).start()
         
     except Exception as e:
         logger.error(f"Erro ao inicializar agente: {e}")
     finally:
         agent_loading = False
 
-# Inicializar agente ao startar o servidor
-threading.Thread(target=initialize_agent, daemon=True).start()
+def prewarm_llm():
+    """Importa o SDK do provedor antes da primeira pergunta"""
+    try:
+        started = time.perf_counter()
+        llm_provider.warmup()
+        logger.info(f"SDK do LLM pré-carregado em {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.warning(f"Falha ao pré-carregar SDK do LLM: {e}")
+
+@atexit.register
+def save_caches_on_exit():
+    """Persiste as respostas obtidas do LLM para o próximo reinício"""
+    if nf_agent is not None and nf_agent.is_ready:
+        nf_agent.save_caches()
+
+# Inicializar agente ao startar o servidor (NF_AGENT_AUTOLOAD=0 desliga, ex.: benchmarks)
+if os.getenv("NF_AGENT_AUTOLOAD", "1") != "0":
+    threading.Thread(target=initialize_agent, daemon=True).start()
 
 # ========== ROTAS DA API ==========
 
@@ -334,6 +981,10 @@ def health_check():
         "status": "ok",
         "agent_ready": nf_agent is not None and nf_agent.is_ready,
         "agent_loading": agent_loading,
+        "load_progress": {
+            "stage": nf_agent.load_stage if nf_agent else "pending",
+            "percent": nf_agent.load_percent if nf_agent else 0
+        },
         "timestamp": time.time()
     })
 
@@ -343,22 +994,43 @@ def get_summary():
     if not nf_agent or not nf_agent.is_ready:
         return jsonify({"error": "Agente não está pronto"}), 503
     
+    # Corpo pré-calculado no carregamento; 304 se o cliente já tem esta versão
+    cached = nf_agent.summary_response
+    if cached is not None:
+        return json_response(cached["variants"], etag=cached["etag"])
+    
     summary = nf_agent.get_summary()
     if "error" in summary:
         return jsonify(summary), 500
     
     return jsonify(summary)
 
-@app.route('/api/query', methods=['POST'])
+@app.route('/api/validation', methods=['GET'])
+def get_validation():
+    """Retorna o relatório de consistência gerado no carregamento"""
+    if not nf_agent or not nf_agent.is_ready:
+        return jsonify({"error": "Agente não está pronto"}), 503
+    
+    report = nf_agent.validation_report
+    if "error" in report:
+        return jsonify(report), 500
+    
+    return jsonify(report)
+
+@app.route('/api/query', methods=['GET', 'POST'])
 def process_query():
-    """Processa pergunta do usuário"""
+    """
+    Processa pergunta do usuário. POST com JSON é o uso do front (com
+    session_id); GET com ?question= serve respostas cacheáveis a clientes que
+    revalidam com If-None-Match e recebem 304 quando já têm a resposta.
+    """
     if not nf_agent or not nf_agent.is_ready:
         return jsonify({
             "status": "error",
             "error": "Agente não está pronto. Aguarde o carregamento dos dados."
         }), 503
     
-    data = request.get_json()
+    data = request.args if request.method == 'GET' else request.get_json()
     if not data or 'question' not in data:
         return jsonify({
             "status": "error",
@@ -372,15 +1044,49 @@ def process_query():
             "error": "Pergunta vazia"
         }), 400
     
+    # Opcional: identifica a conversa para perguntas de continuação
+    session_id = str(data['session_id']) if data.get('session_id') else None
+    
+    started = time.perf_counter()
     try:
+        # O ETag depende só da versão dos dados, do LLM e da pergunta: num GET
+        # revalidado devolve 304 sem consultar cache nem LLM. Com sessão, a
+        # pergunta passa pelo agente para atualizar o contexto da conversa.
+        if session_id is None:
+            etag = nf_agent.query_etag(question)
+            if not_modified(etag):
+                if query_recorder is not None:
+                    query_recorder.record(question, source="not_modified", cached=True,
+                                          latency_ms=round((time.perf_counter() - started) * 1000, 2),
+                                          session_id=None)
+                return not_modified_response(etag)
+        
         logger.info(f"Processando pergunta: {question}")
-        response = nf_agent.query(question)
+        result = nf_agent.answer(question, session_id)
         
-        return jsonify({
-            "status": "success",
-            "response": response,
-            "question": question
-        })
+        if query_recorder is not None:
+            query_recorder.record(question, source=result["source"], cached=result["cached"],
+                                  latency_ms=round((time.perf_counter() - started) * 1000, 2),
+                                  session_id=session_id)
+        
+        # Respostas fixas para a versão dos dados levam ETag; repetições viram 304
+        etag = nf_agent.query_etag(question) if result["cacheable"] else None
+        
+        def build_body():
+            body = app.json.dumps({
+                "status": "success",
+                "response": result["response"],
+                "question": question,
+                "source": result["source"],
+                "cached": result["cached"]
+            }).encode("utf-8")
+            return encode_variants(body)
+        
+        if result["cached"]:
+            variants = nf_agent.cached_response_body(question, result, build_body)
+        else:
+            variants = build_body()
+        return json_response(variants, etag=etag)
         
     except Exception as e:
         logger.error(f"Erro ao processar pergunta: {e}")
@@ -397,11 +1103,12 @@ def reload_agent():
 
 if __name__ == '__main__':
     print("🚀 Iniciando servidor backend...")
-    print("📡 API disponível em: http://localhost:5000")
-    print("🔧 Health check: http://localhost:5000/api/health")
-    print("📊 Resumo: http://localhost:5000/api/summary")
-    print("💬 Query: POST http://localhost:5000/api/query")
+    print(f"📡 API disponível em: http://localhost:{API_PORT}")
+    print(f"🔧 Health check: http://localhost:{API_PORT}/api/health")
+    print(f"📊 Resumo: http://localhost:{API_PORT}/api/summary")
+    print(f"💬 Query: POST http://localhost:{API_PORT}/api/query")
+    print(f"🧪 Validação: http://localhost:{API_PORT}/api/validation")
     
     #app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
-    app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False, threaded=True)
+    app.run(host='0.0.0.0', port=API_PORT, debug=False, use_reloader=False, threaded=True)
     # O uso de `use_reloader=False` evita que o servidor reinicie duas vezes no modo debug
\ No newline at end of file
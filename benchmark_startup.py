@@ -0,0 +1,103 @@
+"""
+ Nome do arquivo: benchmark_startup.py
+ Autor: Alquimistas Digitais
+
+ Mede o tempo de subida do backend, cada medição em um processo novo:
+   - import: tempo para importar agente.py (sem carregar dados)
+   - health: tempo até /api/health responder
+   - ready:  tempo até o agente ficar pronto, com as etapas do carregamento
+
+ Uso: python benchmark_startup.py [--runs 5] [--importtime]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SNIPPET = """
+import time, json
+started = time.perf_counter()
+import agente
+imported = time.perf_counter()
+response = agente.app.test_client().get('/api/health')
+assert response.status_code == 200
+print(json.dumps({"import": imported - started, "health": time.perf_counter() - started}))
+"""
+
+READY_SNIPPET = """
+import time, json
+started = time.perf_counter()
+import agente
+stages = {}
+while True:
+    agent = agente.nf_agent
+    if agent is not None:
+        stages.setdefault(agent.load_stage, time.perf_counter() - started)
+        if agent.is_ready or agent.load_stage == "failed":
+            break
+    elif not agente.agent_loading and time.perf_counter() - started > 5:
+        break
+    time.sleep(0.005)
+print(json.dumps({"ready": time.perf_counter() - started, "stages": stages}))
+"""
+
+
+def run_snippet(snippet: str, autoload: bool) -> dict:
+    env = dict(os.environ, NF_AGENT_AUTOLOAD="1" if autoload else "0", LLM_PROVIDER=os.getenv("LLM_PROVIDER", "fake"))
+    output = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def show_importtime(top: int = 15):
+    """Lista os módulos mais caros ao importar agente.py (python -X importtime)"""
+    env = dict(os.environ, NF_AGENT_AUTOLOAD="0")
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import agente"], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), module.rstrip()))
+    print(f"\nMódulos mais caros (cumulativo, top {top}):")
+    for cumulative_us, module in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de subida do backend")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="mostra os imports mais caros")
+    args = parser.parse_args()
+
+    imports, healths, readies = [], [], []
+    last_stages = {}
+    for _ in range(args.runs):
+        result = run_snippet(IMPORT_SNIPPET, autoload=False)
+        imports.append(result["import"])
+        healths.append(result["health"])
+        result = run_snippet(READY_SNIPPET, autoload=True)
+        readies.append(result["ready"])
+        last_stages = result["stages"]
+
+    def fmt(values):
+        return f"mediana {statistics.median(values) * 1000:8.1f} ms  (min {min(values) * 1000:.1f} / max {max(values) * 1000:.1f})"
+
+    print(f"Execuções: {args.runs}")
+    print(f"import agente : {fmt(imports)}")
+    print(f"/api/health   : {fmt(healths)}")
+    print(f"agente pronto : {fmt(readies)}")
+    print("Etapas (última execução): " + ", ".join(f"{stage} @ {t * 1000:.0f} ms" for stage, t in last_stages.items()))
+
+    if args.importtime:
+        show_importtime()
+
+
+if __name__ == "__main__":
+    main()
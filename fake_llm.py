@@ -0,0 +1,68 @@
+"""
+ Nome do arquivo: fake_llm.py
+ Autor: Alquimistas Digitais
+
+ LLM local e determinístico para testes offline. Permite injetar latência e
+ falhas (429, 503, travamentos) para exercitar o gateway de resiliência sem
+ consumir a quota do Gemini.
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+
+
+class FakeLLMError(Exception):
+    """Erro simulado do provedor, com status HTTP como o das SDKs reais"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+class FakeLLM:
+
+    """
+    Responde de forma determinística a partir do hash da pergunta.
+
+    As taxas de falha são probabilidades por chamada; `hang_seconds` define
+    quanto tempo uma chamada "travada" fica bloqueada.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, hang_rate: float = 0.0,
+                 hang_seconds: float = 60.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeLLM":
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            hang_rate=float(os.getenv("FAKE_LLM_HANG_RATE", "0")),
+            hang_seconds=float(os.getenv("FAKE_LLM_HANG_SECONDS", "60")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+        )
+
+    def __call__(self, pergunta: str) -> str:
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+
+        if roll < self.hang_rate:
+            time.sleep(self.hang_seconds)
+        elif roll < self.hang_rate + self.error_rate:
+            time.sleep(self.latency)
+            status = 429 if roll < self.hang_rate + self.error_rate / 2 else 503
+            raise FakeLLMError(status, "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE")
+
+        time.sleep(self.latency)
+        digest = hashlib.sha1(pergunta.encode("utf-8")).hexdigest()[:8]
+        return f"🤖 Resposta simulada ({digest}) para: {pergunta}"
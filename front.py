@@ -8,6 +8,7 @@ import base64
 import requests
 import json
 import time
+import uuid
 
 # ========== CONFIGURAÇÕES DA PÁGINA ==========
 st.set_page_config(
@@ -49,10 +50,19 @@ def check_api_health():
         return None
 
 def get_data_summary():
-    """Busca resumo dos dados da API"""
+    """Busca resumo dos dados da API, reaproveitando a última versão se não mudou (ETag)"""
     try:
-        response = requests.get(f"{API_BASE_URL}/summary", timeout=10)
-        return response.json() if response.status_code == 200 else None
+        cached = st.session_state.get("summary_cache")
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+        response = requests.get(f"{API_BASE_URL}/summary", headers=headers, timeout=10)
+        if response.status_code == 304 and cached:
+            return cached["data"]
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        if response.headers.get("ETag"):
+            st.session_state.summary_cache = {"etag": response.headers["ETag"], "data": data}
+        return data
     except Exception as e:
         st.error(f"Erro ao buscar resumo: {str(e)}")
         return None
@@ -60,7 +70,8 @@ def get_data_summary():
 def send_query(question):
     """Envia pergunta para a API"""
     try:
-        payload = {"question": question}
+        # A sessão permite perguntas de continuação ("e no Paraná?")
+        payload = {"question": question, "session_id": st.session_state.session_id}
         response = requests.post(
             f"{API_BASE_URL}/query", 
             json=payload, 
@@ -174,6 +185,19 @@ with st.sidebar:
         st.success("Agente IA carregado e pronto!")
     else:
         st.markdown('<div class="status-indicator status-warning">⏳ Carregando agente...</div>', unsafe_allow_html=True)
+        progress = health_status.get("load_progress") or {}
+        etapas = {
+            "pending": "Aguardando",
+            "restoring": "Restaurando snapshot",
+            "extracting": "Extraindo arquivos",
+            "parsing": "Lendo CSVs",
+            "merging": "Combinando dados",
+            "validating": "Validando consistência",
+            "indexing": "Indexando",
+            "ready": "Pronto",
+            "failed": "Falhou"
+        }
+        st.progress(progress.get("percent", 0) / 100, text=etapas.get(progress.get("stage"), "Carregando"))
         st.warning("Aguarde o agente terminar de carregar os dados.")
     
     # Botão para atualizar status
@@ -244,6 +268,8 @@ st.header("💬 Chat com o Agente IA")
 # Inicializar histórico de chat
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Mostrar histórico de chat
 if st.session_state.chat_history:
@@ -277,6 +303,7 @@ if health_status and health_status.get("agent_ready", False):
     
     if limpar:
         st.session_state.chat_history = []
+        st.session_state.session_id = uuid.uuid4().hex
         st.rerun()
     
     if enviar and pergunta.strip():
@@ -0,0 +1,78 @@
+"""
+ Nome do arquivo: http_cache.py
+ Autor: Alquimistas Digitais
+
+ Respostas JSON versionadas: ETag derivado da versão dos dados, 304 quando o
+ cliente já tem a versão atual e corpo pré-comprimido (gzip e, se o pacote
+ brotli estiver instalado, br) quando for grande o suficiente. A revalidação
+ (If-None-Match -> 304) só vale para GET e HEAD, como define a RFC 9110.
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Dict, Optional
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # br é opcional; gzip sempre está disponível
+    brotli = None
+
+# Corpos menores que isso não compensam a compressão
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+# Ordem de preferência quando o cliente aceita mais de uma codificação
+ENCODINGS = ("br", "gzip")
+
+
+def encode_variants(body: bytes) -> Dict[str, bytes]:
+    """Corpo original e versões comprimidas, calculadas uma única vez"""
+    variants = {"identity": body}
+    if len(body) >= COMPRESS_MIN_SIZE:
+        variants["gzip"] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=5)
+    return variants
+
+
+def make_etag(*parts: str) -> str:
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def not_modified(etag: Optional[str]) -> bool:
+    """Indica se a requisição GET/HEAD já tem o ETag no If-None-Match"""
+    return (etag is not None and request.method in ("GET", "HEAD")
+            and request.if_none_match.contains_weak(etag))
+
+
+def _set_cache_headers(response: Response, etag: str) -> Response:
+    # ETag fraco: o conteúdo é o mesmo em qualquer codificação
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def not_modified_response(etag: str) -> Response:
+    """304 sem corpo, para quem já tem a versão atual"""
+    return _set_cache_headers(Response(status=304), etag)
+
+
+def json_response(variants: Dict[str, bytes], etag: Optional[str] = None, status: int = 200) -> Response:
+    """
+    Monta a resposta com a melhor codificação aceita pelo cliente. Com ETag,
+    devolve 304 sem corpo se o cliente já tiver a versão atual (só em GET/HEAD).
+    """
+    if not_modified(etag):
+        return not_modified_response(etag)
+
+    encoding = next((e for e in ENCODINGS if e in variants and request.accept_encodings[e]), "identity")
+    response = Response(variants[encoding], status=status, mimetype="application/json")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+
+    if etag is not None:
+        _set_cache_headers(response, etag)
+    return response
@@ -0,0 +1,267 @@
+"""
+ Nome do arquivo: llm_gateway.py
+ Autor: Alquimistas Digitais
+
+ Camada de resiliência em volta das chamadas ao modelo: limite de taxa
+ (token bucket) alinhado à quota, retry com backoff exponencial e jitter
+ para erros transitórios, prazo por chamada e circuit breaker.
+
+ Cada tentativa roda em uma thread daemon própria: uma chamada que estoura o
+ prazo é abandonada sem prender um worker, então travamentos do provedor não
+ esgotam a concorrência nem impedem a chamada de teste do meio-aberto. O
+ prazo também é repassado às SDKs (llm_provider.py) para que elas encerrem a
+ conexão por conta própria.
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(Exception):
+    """O modelo não pode ser usado agora (circuito aberto, quota ou prazo esgotados)"""
+
+
+class LLMTimeoutError(Exception):
+    """A chamada ao modelo não terminou dentro do prazo"""
+
+
+# Falhas transitórias do provedor: status HTTP, status gRPC/google (texto) e
+# trechos de mensagem sem dígitos ("5000 tokens" não pode parecer um 500)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_STATUS_NAMES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL"}
+RETRYABLE_MARKERS = ("resource_exhausted", "resource exhausted", "rate limit", "too many requests",
+                     "unavailable", "deadline exceeded", "timed out", "temporarily")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Indica se a falha é do lado do provedor (prazo, 429, 5xx, conexão) e vale repetir"""
+    if isinstance(exc, (LLMTimeoutError, TimeoutError, ConnectionError)):
+        return True
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value in RETRYABLE_STATUS
+        if isinstance(value, str) and value.upper() in RETRYABLE_STATUS_NAMES:
+            return True
+    message = str(exc).lower()
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+
+class TokenBucket:
+
+    """Limitador de taxa do lado do cliente (token bucket)"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Consome um token se houver; senão retorna quantos segundos faltam para o próximo"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda um token por até `timeout` segundos"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining < wait:
+                    return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+
+    """
+    Circuit breaker clássico: após `failure_threshold` falhas seguidas abre o
+    circuito e falha rápido; depois de `reset_timeout` segundos deixa passar
+    uma chamada de teste (meio-aberto) antes de fechar novamente.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def release_probe(self):
+        """Libera a vaga de teste do meio-aberto sem contar sucesso nem falha do provedor"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("Circuit breaker do LLM aberto")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class LLMGateway:
+
+    """Executa chamadas ao modelo respeitando quota, prazo, retries e circuit breaker"""
+
+    def __init__(self, limiter: Optional[TokenBucket], breaker: CircuitBreaker,
+                 call_timeout: float = 20.0, deadline: float = 25.0,
+                 max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0,
+                 max_concurrency: int = 8):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Limita as chamadas aguardadas; a vaga é liberada no prazo mesmo que a thread siga travada
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial com full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _run_attempt(self, fn: Callable[..., Any], args: tuple, kwargs: dict, timeout: float) -> Any:
+        """Roda fn em uma thread daemon e espera até `timeout` segundos"""
+        outcome: dict = {}
+        done = threading.Event()
+
+        def target():
+            try:
+                outcome["result"] = fn(*args, **kwargs)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=target, name="llm-call", daemon=True).start()
+        if not done.wait(timeout):
+            raise LLMTimeoutError(f"LLM não respondeu em {timeout:.1f}s")
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Chama fn(*args, **kwargs) ou levanta LLMUnavailableError"""
+        deadline = time.monotonic() + self.deadline
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(self.max_retries + 1):
+            if self.breaker.state == CircuitBreaker.OPEN:
+                raise LLMUnavailableError("Circuito do LLM aberto") from last_error
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self.limiter is not None and not self.limiter.acquire(timeout=remaining)):
+                raise LLMUnavailableError("Quota do LLM esgotada dentro do prazo") from last_error
+
+            if not self.breaker.allow():
+                raise LLMUnavailableError("Circuito do LLM aberto") from last_error
+
+            remaining = deadline - time.monotonic()
+            if not self._slots.acquire(timeout=max(0.0, remaining)):
+                self.breaker.release_probe()
+                raise LLMUnavailableError("Concorrência do LLM esgotada dentro do prazo") from last_error
+            try:
+                remaining = deadline - time.monotonic()
+                result = self._run_attempt(fn, args, kwargs, max(0.0, min(self.call_timeout, remaining)))
+            except Exception as e:
+                last_error = e
+                if not is_retryable(e):
+                    # Prompt inválido, autenticação ou erro local: não diz nada sobre a
+                    # saúde do provedor, então não conta para o circuit breaker
+                    self.breaker.release_probe()
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self._slots.release()
+
+            self.breaker.record_failure()
+            logger.warning(f"Falha transitória no LLM (tentativa {attempt + 1}): {last_error}")
+            if attempt == self.max_retries:
+                break
+            delay = self._backoff(attempt)
+            if time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+
+        raise LLMUnavailableError(f"LLM indisponível: {last_error}") from last_error
+
+
+def gateway_from_env(default_rate_per_minute: float = 10.0) -> LLMGateway:
+    """
+    Cria o gateway a partir das variáveis de ambiente. O limite padrão vem do
+    provedor (quota gratuita do Gemini); LLM_RATE_PER_MINUTE=0 desliga o limitador.
+    """
+    rate_per_minute = float(os.getenv("LLM_RATE_PER_MINUTE", str(default_rate_per_minute)))
+    limiter = None
+    if rate_per_minute > 0:
+        limiter = TokenBucket(rate_per_minute / 60.0, float(os.getenv("LLM_BURST", "3")))
+    return LLMGateway(
+        limiter=limiter,
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+        ),
+        call_timeout=float(os.getenv("LLM_TIMEOUT", "20")),
+        deadline=float(os.getenv("LLM_DEADLINE", "25")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    )
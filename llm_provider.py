@@ -0,0 +1,268 @@
+"""
+ Nome do arquivo: llm_provider.py
+ Autor: Alquimistas Digitais
+
+ Interface única para os modelos de linguagem usados pelo agente. O provedor
+ é escolhido por configuração (LLM_PROVIDER) e modelo, temperatura e streaming
+ são ajustados em um só lugar:
+
+   - gemini:    SDK google-genai
+   - langchain: LangChain + langchain-google-genai
+   - fake:      modelo local determinístico, para testes offline e de carga
+"""
+
+import os
+import threading
+import logging
+from typing import Dict, List, Optional, Sequence, Type
+
+from fake_llm import FakeLLM
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.5-flash-preview-04-17"
+DEFAULT_TEMPERATURE = 0.3
+
+# Arquivos enviados ao modelo junto com cada pergunta
+ARQUIVOS_CSV = (
+    "extracted_files/202401_NFs_Cabecalho.csv",
+    "extracted_files/202401_NFs_Itens.csv",
+)
+
+SYSTEM_PROMPT = """- Forneça uma resposta clara e direta
+- Use os dados fornecidos acima
+- Seja específico e inclua números quando possível
+- Use emojis para tornar a resposta mais amigável
+- Não inclua explicações técnicas ou código
+- Responda em português brasileiro"""
+
+
+class LLMProvider:
+
+    """Classe base dos provedores de LLM"""
+
+    name = "base"
+    requires_api_key = True
+    # Quota padrão de requisições por minuto (0 = sem limite no cliente)
+    default_rate_per_minute = 10.0
+
+    def __init__(self, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE,
+                 streaming: bool = False, api_key: Optional[str] = None,
+                 arquivos: Sequence[str] = ARQUIVOS_CSV, timeout: Optional[float] = None):
+        self.model = model
+        self.temperature = temperature
+        self.streaming = streaming
+        self.api_key = api_key
+        self.arquivos = tuple(arquivos)
+        # Prazo por requisição repassado à SDK (segundos; None = padrão da SDK)
+        self.timeout = timeout
+        self._payload_cache: Dict[str, tuple] = {}
+        self._payload_lock = threading.Lock()
+
+    @property
+    def identity(self) -> str:
+        """Provedor, modelo e temperatura: respostas guardadas só valem para a mesma identidade"""
+        return f"{self.name}:{self.model}:{self.temperature}"
+
+    def __call__(self, pergunta: str, anexos: Optional[List[bytes]] = None) -> str:
+        return self.generate(pergunta, anexos)
+
+    def generate(self, pergunta: str, anexos: Optional[List[bytes]] = None) -> str:
+        """
+        Responde à pergunta usando os arquivos CSV como contexto. `anexos`
+        substitui os arquivos completos (ex.: recorte filtrado em perguntas de
+        continuação); lista vazia envia só o texto.
+        """
+        raise NotImplementedError
+
+    def _anexos(self, anexos: Optional[List[bytes]]) -> List[bytes]:
+        return self.read_payload() if anexos is None else anexos
+
+    def warmup(self):
+        """Carrega SDK, cliente e arquivos anexados antecipadamente (os imports são lazy)"""
+        if all(os.path.exists(path) for path in self.arquivos):
+            self.read_payload()
+
+    def read_payload(self) -> List[bytes]:
+        """Conteúdo dos arquivos anexados, lido do disco apenas quando muda"""
+        payload = []
+        with self._payload_lock:
+            for path in self.arquivos:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                cached = self._payload_cache.get(path)
+                if cached is None or cached[0] != signature:
+                    with open(path, "rb") as f:
+                        cached = (signature, f.read())
+                    self._payload_cache[path] = cached
+                payload.append(cached[1])
+        return payload
+
+    def export_payload_cache(self) -> Dict[str, tuple]:
+        with self._payload_lock:
+            return dict(self._payload_cache)
+
+    def import_payload_cache(self, cache: Dict[str, tuple]):
+        """Restaura o cache salvo; entradas de arquivos alterados são relidas em read_payload"""
+        with self._payload_lock:
+            for path, entry in cache.items():
+                self._payload_cache.setdefault(path, entry)
+
+
+class GeminiSDKProvider(LLMProvider):
+
+    """Gemini via SDK oficial google-genai"""
+
+    name = "gemini"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from google import genai
+            from google.genai import types
+            # A SDK espera o prazo em milissegundos
+            http_options = types.HttpOptions(timeout=int(self.timeout * 1000)) if self.timeout else None
+            self._client = genai.Client(api_key=self.api_key, http_options=http_options)
+        return self._client
+
+    def warmup(self):
+        from google.genai import types  # noqa: F401
+        self._get_client()
+        super().warmup()
+
+    def generate(self, pergunta: str, anexos: Optional[List[bytes]] = None) -> str:
+        from google.genai import types
+
+        client = self._get_client()
+        parts = [types.Part.from_bytes(mime_type="text/csv", data=data) for data in self._anexos(anexos)]
+        parts.append(types.Part.from_text(text=pergunta))
+        contents = [types.Content(role="user", parts=parts)]
+
+        config = types.GenerateContentConfig(
+            temperature=self.temperature,
+            thinking_config=types.ThinkingConfig(thinking_budget=0),
+            response_mime_type="text/plain",
+            system_instruction=[types.Part.from_text(text=SYSTEM_PROMPT)],
+        )
+
+        if not self.streaming:
+            response = client.models.generate_content(model=self.model, contents=contents, config=config)
+            return response.text or ""
+
+        resposta = ""
+        for chunk in client.models.generate_content_stream(model=self.model, contents=contents, config=config):
+            resposta += chunk.text or ""
+        return resposta
+
+
+class LangChainProvider(LLMProvider):
+
+    """Gemini via LangChain (ChatGoogleGenerativeAI)"""
+
+    name = "langchain"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._llm = None
+
+    def _get_llm(self):
+        if self._llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            self._llm = ChatGoogleGenerativeAI(
+                model=self.model,
+                temperature=self.temperature,
+                google_api_key=self.api_key,
+                timeout=self.timeout,
+                # Os retries ficam com o gateway, que respeita o prazo total
+                max_retries=0,
+            )
+        return self._llm
+
+    def warmup(self):
+        from langchain_core.messages import HumanMessage  # noqa: F401
+        self._get_llm()
+        super().warmup()
+
+    def generate(self, pergunta: str, anexos: Optional[List[bytes]] = None) -> str:
+        import base64
+        from langchain_core.messages import HumanMessage
+
+        arquivos = self._anexos(anexos)
+        if anexos is None:
+            descricao = "Cabeçalho das NFs e Itens das NFs"
+        else:
+            descricao = "recorte filtrado do Cabeçalho e dos Itens das NFs" if arquivos else "nenhum"
+        message_content = [
+            {
+                "type": "text",
+                "text": f"Instruções: {SYSTEM_PROMPT}\n\nArquivos CSV anexados: {descricao}\n\nPergunta: {pergunta}"
+            }
+        ]
+        for data in arquivos:
+            message_content.append({
+                "type": "media",
+                "mime_type": "text/csv",
+                "data": base64.b64encode(data).decode("utf-8")
+            })
+
+        llm = self._get_llm()
+        message = HumanMessage(content=message_content)
+        if not self.streaming:
+            return llm.invoke([message]).content
+        return "".join(chunk.content for chunk in llm.stream([message]))
+
+
+class FakeProvider(LLMProvider):
+
+    """Modelo local determinístico com latência e falhas configuráveis (ver fake_llm.py)"""
+
+    name = "fake"
+    requires_api_key = False
+    default_rate_per_minute = 0.0
+
+    def __init__(self, *args, fake: Optional[FakeLLM] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fake = fake or FakeLLM.from_env()
+
+    def generate(self, pergunta: str, anexos: Optional[List[bytes]] = None) -> str:
+        return self.fake(pergunta)
+
+
+PROVIDERS: Dict[str, Type[LLMProvider]] = {
+    GeminiSDKProvider.name: GeminiSDKProvider,
+    LangChainProvider.name: LangChainProvider,
+    FakeProvider.name: FakeProvider,
+}
+
+
+def provider_from_env() -> LLMProvider:
+    """Cria o provedor configurado nas variáveis de ambiente"""
+    name = os.getenv("LLM_PROVIDER", LangChainProvider.name).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"LLM_PROVIDER inválido: {name} (opções: {', '.join(PROVIDERS)})")
+
+    provider = PROVIDERS[name](
+        model=os.getenv("LLM_MODEL", DEFAULT_MODEL),
+        temperature=float(os.getenv("LLM_TEMPERATURE", str(DEFAULT_TEMPERATURE))),
+        streaming=os.getenv("LLM_STREAMING", "0").lower() in ("1", "true", "yes"),
+        api_key=os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY"),
+        timeout=float(os.getenv("LLM_TIMEOUT", "20")),
+    )
+    logger.info(f"Provedor de LLM: {provider.name} ({provider.model})")
+    return provider
+
+
+_default_provider: Optional[LLMProvider] = None
+_default_lock = threading.Lock()
+
+
+def default_provider() -> LLMProvider:
+    """Provedor único do processo (agente e scripts), criado na primeira chamada"""
+    global _default_provider
+    with _default_lock:
+        if _default_provider is None:
+            _default_provider = provider_from_env()
+        return _default_provider
@@ -0,0 +1,59 @@
+"""
+ Nome do arquivo: query_log.py
+ Autor: Alquimistas Digitais
+
+ Registro de perguntas em JSONL, no mesmo formato lido pelo replay.py.
+ Cada linha tem ao menos "question"; o backend acrescenta origem da resposta,
+ uso de cache, latência e horário.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+
+    """Acrescenta perguntas atendidas a um arquivo JSONL (seguro entre threads)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, question: str, **fields: Any):
+        entry = {"question": question, "timestamp": time.time()}
+        entry.update(fields)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                self._file.write(line)
+                self._file.flush()
+        except OSError as e:
+            logger.error(f"Erro ao registrar pergunta em {self.path}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_queries(path: str) -> Iterator[Dict[str, Any]]:
+    """Lê um log JSONL e devolve as entradas com pergunta (campo "question")"""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning(f"{path}:{number}: linha JSON inválida ignorada")
+                continue
+            question: Optional[str] = entry.get("question")
+            if isinstance(question, str) and question.strip():
+                entry["question"] = question.strip()
+                yield entry
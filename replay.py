@@ -0,0 +1,232 @@
+"""
+ Nome do arquivo: replay.py
+ Autor: Alquimistas Digitais
+
+ Replay e teste de carga de /api/query a partir de um log JSONL de perguntas
+ (o mesmo formato gravado pelo backend com QUERY_LOG_PATH).
+
+ Relata latência p50/p95/p99, vazão, divisão entre respostas locais (pandas)
+ e do LLM e taxa de acerto do cache.
+
+ Exemplos:
+   python replay.py consultas.jsonl --concurrency 16 --rate 200
+   python replay.py consultas.jsonl --spawn-backend --requests 5000   # backend com LLM fake
+   python replay.py data/consultas_exemplo.jsonl --spawn-backend --url http://localhost:5055/api
+"""
+
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from llm_gateway import TokenBucket
+from query_log import read_queries
+
+DEFAULT_URL = "http://localhost:5000/api"
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por interpolação linear (valores já ordenados)"""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class ReplayStats:
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.sources: Counter = Counter()
+        self.cached = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, latency: float, status: int, body: Optional[Dict[str, Any]]):
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[status] += 1
+            if status != 200 or body is None:
+                self.errors += 1
+                return
+            self.sources[body.get("source", "desconhecida")] += 1
+            if body.get("cached"):
+                self.cached += 1
+
+    def add_error(self, latency: float, error: str):
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[error] += 1
+            self.errors += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        total = len(latencies)
+        answered = sum(self.sources.values())
+        return {
+            "requisicoes": total,
+            "erros": self.errors,
+            "duracao_s": round(elapsed, 3),
+            "vazao_rps": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+            "latencia_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 2),
+                "p95": round(percentile(latencies, 95) * 1000, 2),
+                "p99": round(percentile(latencies, 99) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            },
+            "origens": dict(self.sources),
+            "taxa_cache": round(self.cached / answered, 4) if answered else 0.0,
+            "status": {str(k): v for k, v in self.statuses.items()},
+        }
+
+
+def wait_until_ready(base_url: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            health = requests.get(f"{base_url}/health", timeout=2).json()
+            if health.get("agent_ready"):
+                return True
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def backend_answers(base_url: str) -> bool:
+    """Indica se já há algum servidor respondendo em base_url"""
+    try:
+        requests.get(f"{base_url}/health", timeout=2)
+        return True
+    except requests.RequestException:
+        return False
+
+
+def spawn_backend(base_url: str, fake_latency: float) -> subprocess.Popen:
+    """Sobe o backend real com o LLM local (fake), sem quota no cliente, na porta de base_url"""
+    port = urlparse(base_url).port or 80
+    # Sem snapshot nem log de consultas: respostas falsas e tráfego sintético não podem
+    # chegar ao .snapshot/ nem ao log usados pelo backend de produção
+    env = dict(os.environ, LLM_PROVIDER="fake", FAKE_LLM_LATENCY=str(fake_latency), API_PORT=str(port),
+               SNAPSHOT_DIR="")
+    env.pop("QUERY_LOG_PATH", None)
+    root = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen([sys.executable, "agente.py"], cwd=root, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def replay(entries: List[Dict[str, Any]], base_url: str, concurrency: int, rate: float,
+           total: int, timeout: float) -> Dict[str, Any]:
+    """Envia `total` perguntas (repetindo o log em ciclo) e devolve o relatório"""
+    stats = ReplayStats()
+    limiter = TokenBucket(rate, max(1.0, rate / 10)) if rate > 0 else None
+    pending: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+    for i in range(total):
+        pending.put(entries[i % len(entries)])
+    for _ in range(concurrency):
+        pending.put(None)
+
+    def worker():
+        session = requests.Session()
+        while True:
+            entry = pending.get()
+            if entry is None:
+                return
+            if limiter is not None:
+                limiter.acquire()
+            payload = {"question": entry["question"]}
+            if entry.get("session_id"):
+                payload["session_id"] = entry["session_id"]
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}/query", json=payload, timeout=timeout)
+                latency = time.perf_counter() - started
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = None
+                stats.add(latency, response.status_code, body)
+            except requests.RequestException as e:
+                stats.add_error(time.perf_counter() - started, type(e).__name__)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(time.perf_counter() - started)
+
+
+def print_report(report: Dict[str, Any]):
+    latencia = report["latencia_ms"]
+    print(f"Requisições: {report['requisicoes']}  (erros: {report['erros']})")
+    print(f"Duração: {report['duracao_s']:.2f}s  |  Vazão: {report['vazao_rps']:.1f} req/s")
+    print(f"Latência: p50 {latencia['p50']:.1f} ms  |  p95 {latencia['p95']:.1f} ms  |  "
+          f"p99 {latencia['p99']:.1f} ms  |  máx {latencia['max']:.1f} ms")
+    answered = sum(report["origens"].values()) or 1
+    print("Origem das respostas: " + ", ".join(
+        f"{source} {count} ({count / answered:.1%})" for source, count in sorted(report["origens"].items())))
+    print(f"Acerto de cache: {report['taxa_cache']:.1%}")
+    print("Status: " + ", ".join(f"{k}: {v}" for k, v in report["status"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay/teste de carga de /api/query a partir de um log JSONL")
+    parser.add_argument("log", help="arquivo JSONL com perguntas (campo question)")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"base da API (padrão: {DEFAULT_URL})")
+    parser.add_argument("--concurrency", type=int, default=8, help="requisições simultâneas")
+    parser.add_argument("--rate", type=float, default=0.0, help="limite de req/s (0 = sem limite)")
+    parser.add_argument("--requests", type=int, default=0, help="total de requisições (padrão: uma passada no log)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="timeout por requisição, em segundos")
+    parser.add_argument("--spawn-backend", action="store_true",
+                        help="sobe o backend local com LLM fake na porta da --url")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="latência do LLM fake, em segundos")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = parser.parse_args()
+
+    entries = list(read_queries(args.log))
+    if not entries:
+        parser.error(f"nenhuma pergunta encontrada em {args.log}")
+
+    backend = None
+    if args.spawn_backend:
+        # Sem isso o replay mediria outro servidor que já ocupa a porta
+        if urlparse(args.url).hostname not in LOCAL_HOSTS:
+            parser.error(f"--spawn-backend só sobe o backend local; --url aponta para {args.url}")
+        if backend_answers(args.url):
+            parser.error(f"já há um servidor respondendo em {args.url}; use outra porta em --url "
+                         f"ou rode sem --spawn-backend")
+        backend = spawn_backend(args.url, args.fake_latency)
+    try:
+        if not wait_until_ready(args.url, timeout=120 if backend else 5):
+            print(f"Backend não está pronto em {args.url}", file=sys.stderr)
+            sys.exit(1)
+        report = replay(entries, args.url, args.concurrency, args.rate,
+                        args.requests or len(entries), args.timeout)
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait(timeout=10)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
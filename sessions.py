@@ -0,0 +1,89 @@
+"""
+ Nome do arquivo: sessions.py
+ Autor: Alquimistas Digitais
+
+ Contexto de conversa por sessão, mantido no servidor: a última intenção
+ resolvida, seus filtros e um resultado intermediário pequeno. Permite que
+ perguntas de continuação ("e no Paraná?", "e os 3 primeiros?") refinem a
+ resposta anterior localmente ou enviem ao LLM apenas o que mudou (a
+ interpretação das perguntas fica em timeseries.py).
+
+ A memória é limitada: no máximo SESSION_MAX sessões (LRU), cada uma com um
+ único turno, resultado truncado e expiração após SESSION_TTL segundos ociosa.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+# Limites por sessão
+MAX_RESULT_ROWS = 50
+MAX_ANSWER_CHARS = 2000
+
+
+class SessionContext:
+
+    """Último turno de uma sessão"""
+
+    __slots__ = ("intent", "question", "answer", "result", "updated_at")
+
+    def __init__(self, intent: Optional[Dict[str, Any]], question: str, answer: str, result: Any = None):
+        self.intent = intent
+        self.question = question
+        self.answer = answer[:MAX_ANSWER_CHARS]
+        # Resultado intermediário truncado (Series/DataFrame do pandas)
+        self.result = result.head(MAX_RESULT_ROWS) if hasattr(result, "head") else None
+        self.updated_at = time.monotonic()
+
+
+class SessionStore:
+
+    """Sessões em memória com LRU e expiração por inatividade (seguro entre threads)"""
+
+    def __init__(self, max_sessions: int = SESSION_MAX, ttl: float = SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, SessionContext]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float):
+        # A ordem é de uso, então as sessões expiradas ficam no início
+        while self._sessions:
+            session_id, context = next(iter(self._sessions.items()))
+            if now - context.updated_at < self.ttl:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id: str) -> Optional[SessionContext]:
+        with self._lock:
+            now = time.monotonic()
+            self._evict_expired(now)
+            context = self._sessions.get(session_id)
+            if context is not None:
+                # Leitura também conta como uso: mantém a ordem de uso igual à de updated_at,
+                # que _evict_expired pressupõe
+                context.updated_at = now
+                self._sessions.move_to_end(session_id)
+            return context
+
+    def put(self, session_id: str, context: SessionContext):
+        with self._lock:
+            now = time.monotonic()
+            context.updated_at = now
+            self._sessions[session_id] = context
+            self._sessions.move_to_end(session_id)
+            self._evict_expired(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
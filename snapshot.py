@@ -0,0 +1,194 @@
+"""
+ Nome do arquivo: snapshot.py
+ Autor: Alquimistas Digitais
+
+ Snapshot versionado do estado pronto do agente, para reinícios rápidos.
+ Guarda os DataFrames já tipados (Arrow/Feather, lidos com memory-map), o
+ índice temporal (.npy com mmap), agregados, rollups, relatório de validação
+ e os caches de respostas e de payload do LLM.
+
+ Cada DataFrame é gravado como um único lote Arrow, o que permite lê-lo sem
+ cópia: colunas numéricas e de data sem nulos viram arrays somente leitura
+ sobre o arquivo mapeado, e o texto fica em Arrow no pandas 3 (no pandas 2
+ vira object e é copiado). Colunas com nulos são materializadas na leitura.
+
+ O snapshot só é usado se o hash do ZIP de origem e a versão do código forem
+ os mesmos da gravação; caso contrário o agente faz o carregamento completo.
+ Respostas do LLM guardadas no cache só são restauradas para o mesmo
+ provedor, modelo e temperatura (LLMProvider.identity).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+# Módulos que definem o formato do estado; alterar qualquer um invalida o snapshot
+CODE_FILES = ("agente.py", "timeseries.py", "validation.py", "sessions.py", "snapshot.py", "llm_provider.py")
+
+MANIFEST = "manifest.json"
+FRAMES = ("df_cabecalho", "df_itens", "df_combined")
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version() -> str:
+    """Hash do código que produz o estado salvo"""
+    base = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(str(SNAPSHOT_FORMAT).encode())
+    for name in CODE_FILES:
+        path = os.path.join(base, name)
+        if os.path.exists(path):
+            digest.update(_hash_file(path).encode())
+    return digest.hexdigest()[:16]
+
+
+def snapshot_key(zip_path: str) -> Dict[str, str]:
+    """Chave do snapshot: hash do ZIP de origem + versão do código"""
+    return {"zip_hash": _hash_file(zip_path), "code_version": code_version()}
+
+
+def _write_frame(df, path: str):
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError:
+        df.to_pickle(path + ".pkl")
+        return
+
+    # Sem compressão e em um único lote, para que a leitura use memory-map sem cópia
+    table = pa.Table.from_pandas(df).combine_chunks()
+    feather.write_feather(table, path + ".arrow", compression="uncompressed", chunksize=max(table.num_rows, 1))
+
+
+def _read_frame(path: str):
+    if os.path.exists(path + ".arrow"):
+        import pyarrow.feather as feather
+        # split_blocks evita consolidar colunas (o que copiaria tudo); os arrays ficam sobre o mapa
+        return feather.read_table(path + ".arrow", memory_map=True).to_pandas(split_blocks=True)
+
+    import pandas as pd
+    return pd.read_pickle(path + ".pkl")
+
+
+def read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _dump_pickle(obj, path: str):
+    # Temporário com nome único: gravações concorrentes (snapshot inicial, caches, saída) não colidem
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_caches(agent, directory: str):
+    """Grava apenas os caches (respostas e payload do LLM), que mudam durante a execução"""
+    caches = {
+        "llm": agent.llm.identity,
+        "answers": agent.export_answer_cache(),
+        "payload": agent.llm.export_payload_cache(),
+    }
+    _dump_pickle(caches, os.path.join(directory, "caches.pkl"))
+
+
+def save_snapshot(agent, directory: str, key: Dict[str, str]):
+    """Grava o estado pronto do agente; o manifesto é escrito por último"""
+    import numpy as np
+
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+
+    # Sem manifesto o snapshot é ignorado, então uma gravação interrompida não é lida
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    for name in FRAMES:
+        _write_frame(getattr(agent, name), os.path.join(directory, name))
+
+    np.save(os.path.join(directory, "time_valores.npy"), agent._time_index.valores)
+    np.save(os.path.join(directory, "time_posicoes.npy"), agent._time_index.posicoes)
+
+    state = {
+        "aggregates": agent._aggregates,
+        "rollups": agent.rollups,
+        "validation_report": agent.validation_report,
+    }
+    _dump_pickle(state, os.path.join(directory, "state.pkl"))
+    save_caches(agent, directory)
+
+    manifest = dict(key, format=SNAPSHOT_FORMAT, data_version=agent.data_version, created_at=time.time())
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    logger.info(f"Snapshot gravado em {directory} ({time.perf_counter() - started:.2f}s)")
+
+
+def load_snapshot(agent, directory: str, key: Dict[str, str]) -> bool:
+    """Restaura o estado salvo se a chave bater; retorna False para cair no carregamento completo"""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return False
+    if manifest.get("format") != SNAPSHOT_FORMAT or any(manifest.get(k) != v for k, v in key.items()):
+        logger.info("Snapshot desatualizado (ZIP ou código mudaram); fazendo carregamento completo")
+        return False
+
+    import numpy as np
+    from timeseries import TimeIndex
+
+    started = time.perf_counter()
+    frames = {name: _read_frame(os.path.join(directory, name)) for name in FRAMES}
+
+    time_index = TimeIndex.__new__(TimeIndex)
+    time_index.valores = np.load(os.path.join(directory, "time_valores.npy"), mmap_mode="r")
+    time_index.posicoes = np.load(os.path.join(directory, "time_posicoes.npy"), mmap_mode="r")
+
+    with open(os.path.join(directory, "state.pkl"), "rb") as f:
+        state = pickle.load(f)
+
+    caches = {}
+    caches_path = os.path.join(directory, "caches.pkl")
+    if os.path.exists(caches_path):
+        try:
+            with open(caches_path, "rb") as f:
+                caches = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Cache do snapshot ilegível, ignorando: {e}")
+
+    for name, df in frames.items():
+        setattr(agent, name, df)
+    agent._time_index = time_index
+    agent._aggregates = state["aggregates"]
+    agent.rollups = state["rollups"]
+    agent.validation_report = state["validation_report"]
+    agent.data_version = manifest["data_version"]
+    agent.import_answer_cache(caches.get("answers", []), caches.get("llm"))
+    agent.llm.import_payload_cache(caches.get("payload", {}))
+
+    logger.info(f"Snapshot restaurado de {directory} ({time.perf_counter() - started:.2f}s)")
+    return True
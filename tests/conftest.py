@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Backend offline: LLM local, sem carregamento automático nem snapshot
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "0")
+os.environ["NF_AGENT_AUTOLOAD"] = "0"
+os.environ["SNAPSHOT_DIR"] = ""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DATA_DIR = os.path.join(ROOT, "data")
+
+
+@pytest.fixture(scope="session")
+def agent():
+    import agente
+
+    nf_agent = agente.NFAnalysisAgent(agente.llm_provider)
+    assert nf_agent.load_csv_files(os.path.join(DATA_DIR, "202401_NFs_Cabecalho.csv"),
+                                   os.path.join(DATA_DIR, "202401_NFs_Itens.csv"))
+    return nf_agent
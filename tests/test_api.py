@@ -0,0 +1,69 @@
+import pytest
+
+
+@pytest.fixture
+def client(agent, monkeypatch):
+    import agente
+
+    monkeypatch.setattr(agente, "nf_agent", agent)
+    return agente.app.test_client()
+
+
+QUESTION = {"question": "Qual o fornecedor que teve maior montante recebido?"}
+
+
+def test_if_none_match_skips_answer(agent, client, monkeypatch):
+    first = client.get("/api/query", query_string=QUESTION)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    # Mesmo com o cache de respostas vazio, o 304 sai sem consultar o agente
+    with agent._answer_cache_lock:
+        agent._answer_cache.clear()
+    monkeypatch.setattr(agent, "answer", lambda *a, **k: pytest.fail("answer chamado"))
+    response = client.get("/api/query", query_string=QUESTION, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.data == b""
+
+
+def test_cached_body_encoded_once(agent, client, monkeypatch):
+    import agente
+
+    client.post("/api/query", json=QUESTION)
+    calls = []
+    encode = agente.encode_variants
+    monkeypatch.setattr(agente, "encode_variants", lambda body: calls.append(body) or encode(body))
+
+    bodies = [client.post("/api/query", json=QUESTION).data for _ in range(3)]
+    assert bodies[0] == bodies[1] == bodies[2]
+    assert all(body.startswith(b'{"cached": true') for body in bodies)
+    assert len(calls) <= 1
+
+
+def test_post_ignores_if_none_match(client):
+    # RFC 9110: If-None-Match em POST não gera 304
+    etag = client.post("/api/query", json=QUESTION).headers["ETag"]
+    response = client.post("/api/query", json=QUESTION, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["response"]
+
+
+def test_not_modified_is_recorded(agent, client, monkeypatch, tmp_path):
+    import agente
+    from query_log import QueryRecorder, read_queries
+
+    path = str(tmp_path / "consultas.jsonl")
+    recorder = QueryRecorder(path)
+    monkeypatch.setattr(agente, "query_recorder", recorder)
+    etag = client.get("/api/query", query_string=QUESTION).headers["ETag"]
+    client.get("/api/query", query_string=QUESTION, headers={"If-None-Match": etag})
+    recorder.close()
+
+    assert [entry["source"] for entry in read_queries(path)] == ["pandas", "not_modified"]
+
+
+def test_query_etag_changes_with_llm(agent, monkeypatch):
+    before = agent.query_etag(QUESTION["question"])
+    monkeypatch.setattr(agent.llm, "model", "outro-modelo")
+    assert agent.query_etag(QUESTION["question"]) != before
@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.mark.parametrize("question", [
+    "Qual o valor médio das notas emitidas em janeiro?",
+    "Quantos itens foram vendidos em janeiro?",
+    "Qual a nota de menor valor em janeiro?",
+])
+def test_period_questions_outside_totals_go_to_llm(agent, question):
+    assert agent.resolve_intent(question) is None
+    result = agent.answer(question)
+    assert result["source"] == "llm"
+    assert "notas** somando" not in result["response"]
+
+
+@pytest.mark.parametrize("question", [
+    "Qual o total de notas em janeiro de 2024?",
+    "Quantas notas foram emitidas entre 10/01/2024 e 12/01/2024?",
+    "Qual o valor total emitido em janeiro?",
+])
+def test_period_totals_answered_locally(agent, question):
+    intent = agent.resolve_intent(question)
+    assert intent is not None and intent["intent"] == "periodo"
+    assert "notas** somando R$" in agent.answer(question)["response"]
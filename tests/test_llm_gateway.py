@@ -0,0 +1,162 @@
+import time
+
+import pytest
+
+from fake_llm import FakeLLM, FakeLLMError
+from llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailableError, TokenBucket, is_retryable
+
+
+MESSAGES = {429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE"}
+
+
+class Scripted:
+
+    """Chama o FakeLLM, mas antes aplica os efeitos roteirizados (erro ou travamento)"""
+
+    def __init__(self, *effects, hang_seconds=2.0):
+        self.effects = list(effects)
+        self.hang_seconds = hang_seconds
+        self.fake = FakeLLM()
+
+    def __call__(self, pergunta):
+        effect = self.effects.pop(0) if self.effects else None
+        if effect == "hang":
+            time.sleep(self.hang_seconds)
+        elif effect is not None:
+            raise FakeLLMError(effect, MESSAGES.get(effect, "INVALID_ARGUMENT"))
+        return self.fake(pergunta)
+
+
+def make_gateway(failure_threshold=5, reset_timeout=30.0, **kwargs):
+    options = dict(call_timeout=0.2, deadline=2.0, max_retries=2, base_delay=0.001, max_delay=0.01)
+    options.update(kwargs)
+    return LLMGateway(None, CircuitBreaker(failure_threshold, reset_timeout), **options)
+
+
+def test_token_bucket_burst_then_wait():
+    bucket = TokenBucket(rate_per_second=20.0, capacity=2)
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() > 0
+    assert not bucket.acquire(timeout=0.0)
+    assert bucket.acquire(timeout=1.0)
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_transient_errors_are_retried(status):
+    llm = Scripted(status, status)
+    gateway = make_gateway()
+    assert gateway.call(llm, "pergunta").startswith("🤖")
+    assert llm.fake.calls == 1
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_retryable_error_raised_at_once():
+    llm = Scripted(400)
+    with pytest.raises(FakeLLMError):
+        make_gateway().call(llm, "pergunta")
+    assert llm.effects == []
+    assert not is_retryable(FakeLLMError(400, "INVALID_ARGUMENT"))
+
+
+def test_non_retryable_errors_do_not_open_breaker():
+    gateway = make_gateway(failure_threshold=1)
+    for _ in range(5):
+        with pytest.raises(FakeLLMError):
+            gateway.call(Scripted(400), "pergunta")
+    with pytest.raises(FileNotFoundError):
+        gateway.call(lambda pergunta: open("/nao/existe.csv"), "pergunta")
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+    assert gateway.call(FakeLLM(), "pergunta").startswith("🤖")
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (FakeLLMError(429, "RESOURCE_EXHAUSTED"), True),
+    (FakeLLMError(502, "Bad Gateway"), True),
+    (FakeLLMError(400, "prompt com 5000 tokens excede o limite"), False),
+    (FakeLLMError(401, "API key inválida"), False),
+    (ValueError("prompt com 5000 tokens e 503 linhas"), False),
+    (RuntimeError("Service temporarily unavailable"), True),
+    (ConnectionError("reset"), True),
+])
+def test_is_retryable(exc, expected):
+    assert is_retryable(exc) is expected
+
+
+def test_retries_exhausted():
+    gateway = make_gateway(max_retries=1)
+    with pytest.raises(LLMUnavailableError):
+        gateway.call(FakeLLM(error_rate=1.0), "pergunta")
+
+
+def test_timeout_does_not_wait_for_hung_call():
+    llm = Scripted("hang", "hang", "hang")
+    gateway = make_gateway(max_retries=0)
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailableError, match="não respondeu"):
+        gateway.call(llm, "pergunta")
+    assert time.monotonic() - started < 1.0
+
+
+def test_timeout_then_retry_succeeds():
+    assert make_gateway().call(Scripted("hang"), "pergunta").startswith("🤖")
+
+
+def test_breaker_opens_and_fails_fast():
+    gateway = make_gateway(failure_threshold=2, max_retries=1)
+    with pytest.raises(LLMUnavailableError):
+        gateway.call(FakeLLM(error_rate=1.0), "pergunta")
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+    llm = FakeLLM()
+    with pytest.raises(LLMUnavailableError, match="aberto"):
+        gateway.call(llm, "pergunta")
+    assert llm.calls == 0
+
+
+def test_half_open_recovers_with_hung_calls_in_flight():
+    # Uma vaga só: chamadas travadas não podem impedir o teste do meio-aberto
+    gateway = make_gateway(failure_threshold=1, reset_timeout=0.1, max_retries=0, max_concurrency=1)
+    with pytest.raises(LLMUnavailableError):
+        gateway.call(Scripted("hang"), "pergunta")
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.15)
+    assert gateway.breaker.state == CircuitBreaker.HALF_OPEN
+    assert gateway.call(FakeLLM(), "pergunta").startswith("🤖")
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens():
+    gateway = make_gateway(failure_threshold=1, reset_timeout=0.1, max_retries=0)
+    with pytest.raises(LLMUnavailableError):
+        gateway.call(Scripted(503), "pergunta")
+    time.sleep(0.15)
+    with pytest.raises(LLMUnavailableError):
+        gateway.call(Scripted(503), "pergunta")
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+
+def test_rate_limit_exhausted_within_deadline():
+    gateway = make_gateway(deadline=0.1)
+    gateway.limiter = TokenBucket(rate_per_second=1.0, capacity=1)
+    llm = FakeLLM()
+    gateway.call(llm, "pergunta")
+    with pytest.raises(LLMUnavailableError, match="Quota"):
+        gateway.call(llm, "pergunta")
+    assert llm.calls == 1
+
+
+def test_agent_falls_back_when_llm_unavailable(agent, monkeypatch):
+    import agente
+
+    question = "Explique a sazonalidade dos fornecedores de Sergipe em 2023"
+    gateway = make_gateway(failure_threshold=1, max_retries=0)
+    monkeypatch.setattr(agente, "llm_gateway", gateway)
+    monkeypatch.setattr(agent.llm.fake, "error_rate", 1.0)
+
+    result = agent.answer(question)
+    assert result["source"] == "fallback"
+    assert not result["cacheable"]
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
@@ -0,0 +1,18 @@
+from llm_provider import FakeProvider, default_provider
+
+
+def test_compat_wrappers_share_the_configured_provider(monkeypatch):
+    import agente
+    import call_gemini
+    import call_gemini_lang_chain
+
+    assert default_provider() is agente.llm_provider
+    calls = []
+    monkeypatch.setattr(agente.llm_provider, "generate", lambda pergunta, anexos=None: calls.append(pergunta) or "ok")
+    assert call_gemini.call_gemini("a") == call_gemini_lang_chain.call_gemini("b") == "ok"
+    assert calls == ["a", "b"]
+
+
+def test_identity_tracks_model_and_temperature():
+    assert FakeProvider(model="a").identity != FakeProvider(model="b").identity
+    assert FakeProvider(temperature=0.1).identity != FakeProvider(temperature=0.2).identity
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from query_log import QueryRecorder, read_queries
+from replay import main
+
+from conftest import DATA_DIR
+
+EXEMPLO = os.path.join(DATA_DIR, "consultas_exemplo.jsonl")
+
+
+def test_sample_log_uses_recorder_format():
+    entries = list(read_queries(EXEMPLO))
+    assert entries
+    for entry in entries:
+        assert {"question", "timestamp", "source", "cached", "latency_ms", "session_id"} <= set(entry)
+
+
+def test_read_queries_requires_question(tmp_path):
+    path = str(tmp_path / "consultas.jsonl")
+    recorder = QueryRecorder(path)
+    recorder.record("Quais os 5 estados com mais notas?", source="pandas")
+    recorder.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"title": "sem pergunta"}) + "\n")
+        f.write("{inválida\n\n")
+
+    assert [entry["question"] for entry in read_queries(path)] == ["Quais os 5 estados com mais notas?"]
+
+
+def test_spawn_refuses_busy_url(monkeypatch):
+    monkeypatch.setattr("replay.backend_answers", lambda url: True)
+    monkeypatch.setattr("replay.spawn_backend", lambda *a: pytest.fail("backend iniciado"))
+    monkeypatch.setattr("sys.argv", ["replay.py", EXEMPLO, "--spawn-backend", "--url", "http://localhost:5055/api"])
+    with pytest.raises(SystemExit):
+        main()
+
+
+def test_spawn_refuses_remote_url(monkeypatch):
+    monkeypatch.setattr("replay.spawn_backend", lambda *a: pytest.fail("backend iniciado"))
+    monkeypatch.setattr("sys.argv", ["replay.py", EXEMPLO, "--spawn-backend", "--url", "http://exemplo.com:5000/api"])
+    with pytest.raises(SystemExit):
+        main()
+
+
+def test_spawned_backend_is_isolated(monkeypatch):
+    import replay
+
+    launched = {}
+    monkeypatch.setenv("QUERY_LOG_PATH", "producao.jsonl")
+    monkeypatch.setenv("SNAPSHOT_DIR", ".snapshot")
+    monkeypatch.setattr(replay.subprocess, "Popen", lambda *a, **k: launched.update(k))
+    replay.spawn_backend("http://localhost:5055/api", 0.0)
+
+    env = launched["env"]
+    assert env["SNAPSHOT_DIR"] == ""
+    assert "QUERY_LOG_PATH" not in env
+    assert env["LLM_PROVIDER"] == "fake"
+    assert env["API_PORT"] == "5055"
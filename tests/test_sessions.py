@@ -0,0 +1,158 @@
+import io
+
+import pandas as pd
+import pytest
+
+import sessions
+from sessions import SessionContext, SessionStore
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions.time, "monotonic", clock)
+    return clock
+
+
+def context(question="pergunta"):
+    return SessionContext(None, question, "resposta")
+
+
+def test_store_evicts_least_recently_used(clock):
+    store = SessionStore(max_sessions=2, ttl=60)
+    store.put("a", context())
+    store.put("b", context())
+    assert store.get("a") is not None
+    store.put("c", context())
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert len(store) == 2
+
+
+def test_store_expires_idle_sessions(clock):
+    store = SessionStore(max_sessions=10, ttl=60)
+    store.put("a", context())
+    clock.now += 30
+    store.put("b", context())
+    clock.now += 31
+    assert store.get("a") is None
+    assert store.get("b") is not None
+    clock.now += 61
+    assert store.get("b") is None
+    assert len(store) == 0
+
+
+def test_get_refreshes_ttl(clock):
+    # Sessões só lidas (ex.: continuação respondida pelo LLM) não podem expirar antes da hora
+    store = SessionStore(max_sessions=10, ttl=60)
+    store.put("lida", context())
+    store.put("outra", context())
+    clock.now += 50
+    assert store.get("lida") is not None
+    clock.now += 20
+    assert store.get("outra") is None
+    assert store.get("lida") is not None
+
+
+def test_context_is_truncated():
+    resultado = pd.Series(range(500))
+    ctx = SessionContext({"intent": "estados"}, "pergunta", "x" * 10000, resultado)
+    assert len(ctx.answer) == sessions.MAX_ANSWER_CHARS
+    assert len(ctx.result) == sessions.MAX_RESULT_ROWS
+
+
+@pytest.fixture
+def run_intent_calls(agent, monkeypatch):
+    calls = []
+    original = agent._run_intent
+
+    def spy(intent):
+        calls.append(intent)
+        return original(intent)
+
+    monkeypatch.setattr(agent, "_run_intent", spy)
+    return calls
+
+
+def test_followup_reuses_cached_result(agent, run_intent_calls):
+    # Resposta vinda do cache não guarda o resultado intermediário; força o cálculo
+    with agent._answer_cache_lock:
+        agent._answer_cache.clear()
+    first = agent.answer("Quais os 10 fornecedores de maior montante?", "reuso")
+    assert first["source"] == "pandas" and len(run_intent_calls) == 1
+    run_intent_calls.clear()
+
+    result = agent.answer("e os 3 primeiros?", "reuso")
+    assert run_intent_calls == []
+    assert result["source"] == "pandas" and not result["cacheable"]
+    linhas = [linha for linha in result["response"].splitlines() if linha.startswith("•")]
+    assert len(linhas) == 3
+    assert linhas == [linha for linha in first["response"].splitlines() if linha.startswith("•")][:3]
+
+
+def test_followup_with_new_filter_recomputes(agent, run_intent_calls):
+    agent.answer("Quais os 10 fornecedores de maior montante?", "recalculo")
+    agent.answer("e os 3 primeiros?", "recalculo")
+    run_intent_calls.clear()
+
+    result = agent.answer("e no Paraná?", "recalculo")
+    assert len(run_intent_calls) == 1
+    intent = run_intent_calls[0]
+    assert intent["intent"] == "fornecedor_montante"
+    assert intent["filtros"]["uf"] == "PR" and intent["limite"] == 3
+    assert "(PR)" in result["response"]
+
+
+def test_new_intent_inherits_filters(agent, run_intent_calls):
+    agent.answer("Quais os 5 fornecedores de maior montante de São Paulo?", "heranca")
+    run_intent_calls.clear()
+
+    result = agent.answer("e o produto mais vendido?", "heranca")
+    assert run_intent_calls[-1]["intent"] == "produto_quantidade"
+    assert run_intent_calls[-1]["filtros"]["uf"] == "SP"
+    assert "(SP)" in result["response"]
+
+
+def test_llm_followup_sends_only_the_delta(agent, monkeypatch):
+    import agente
+
+    question = "Qual a natureza da operação mais comum entre as notas?"
+    agent.answer(question, "delta")
+
+    calls = []
+
+    class Gateway:
+        def call(self, fn, pergunta, anexos=None):
+            calls.append((pergunta, anexos))
+            return "resposta do recorte"
+
+    monkeypatch.setattr(agente, "llm_gateway", Gateway())
+    result = agent.answer("e no Paraná?", "delta")
+
+    assert result == {"response": "resposta do recorte", "source": "llm", "cached": False, "cacheable": False}
+    (pergunta, anexos), = calls
+    assert f"Pergunta anterior: {question}" in pergunta
+    assert "Nova pergunta (continuação da anterior): e no Paraná?" in pergunta
+    assert len(anexos) == 2
+    cabecalho = pd.read_csv(io.BytesIO(anexos[0]))
+    assert len(cabecalho) > 0 and set(cabecalho["UF EMITENTE"]) == {"PR"}
+    itens = pd.read_csv(io.BytesIO(anexos[1]))
+    assert set(itens["CHAVE DE ACESSO"]) <= set(cabecalho["CHAVE DE ACESSO"])
+
+    # O turno do LLM vira o novo contexto da sessão
+    assert agent.sessions.get("delta").question == "e no Paraná?"
+
+
+def test_unrelated_question_is_not_a_followup(agent):
+    agent.answer("Quais os 10 fornecedores de maior montante?", "independente")
+    result = agent.answer("Quais os 5 estados com mais notas?", "independente")
+    assert result["response"] == agent.answer("Quais os 5 estados com mais notas?")["response"]
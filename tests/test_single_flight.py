@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from agente import SingleFlight
+
+QUESTION = "Qual a natureza da operação mais frequente entre os emitentes?"
+VARIANTES = [QUESTION, QUESTION.upper(), QUESTION.lower(), f"  {QUESTION}  ", QUESTION.rstrip("?"),
+             QUESTION.replace(" ", "  "), QUESTION + "!"]
+
+
+@pytest.fixture
+def slow_llm(agent, monkeypatch):
+    """LLM fake lento e cache limpo, para que as perguntas se sobreponham"""
+    monkeypatch.setattr(agent.llm.fake, "latency", 0.2)
+    with agent._answer_cache_lock:
+        agent._answer_cache.clear()
+    return agent.llm.fake
+
+
+def run_concurrently(agent, perguntas, atraso=0.0):
+    results = [None] * len(perguntas)
+
+    def ask(i, pergunta):
+        time.sleep(i * atraso)
+        results[i] = agent.answer(pergunta)
+
+    threads = [threading.Thread(target=ask, args=(i, p)) for i, p in enumerate(perguntas)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_variants_make_one_llm_call(agent, slow_llm):
+    assert agent.resolve_intent(QUESTION) is None
+    calls = slow_llm.calls
+    results = run_concurrently(agent, VARIANTES * 3)
+
+    assert slow_llm.calls - calls == 1
+    assert {r["source"] for r in results} == {"llm"}
+    assert len({r["response"] for r in results}) == 1
+
+
+def test_staggered_requests_make_one_llm_call(agent, slow_llm):
+    # Chegadas espalhadas pela duração da chamada, inclusive logo depois dela terminar
+    calls = slow_llm.calls
+    results = run_concurrently(agent, VARIANTES * 4, atraso=0.01)
+
+    assert slow_llm.calls - calls == 1
+    assert len({r["response"] for r in results}) == 1
+
+
+def test_request_after_llm_returns_waits_for_store(agent, slow_llm, monkeypatch):
+    # Alarga a janela entre o fim da chamada e a gravação no cache: quem chega
+    # nela precisa esperar a chave em voo, não fazer outra chamada
+    store = agent._store_answer
+
+    def slow_store(*args):
+        time.sleep(0.2)
+        store(*args)
+
+    monkeypatch.setattr(agent, "_store_answer", slow_store)
+    calls = slow_llm.calls
+    results = run_concurrently(agent, [QUESTION, QUESTION.upper()], atraso=0.3)
+
+    assert slow_llm.calls - calls == 1
+    assert results[0]["response"] == results[1]["response"]
+
+
+def test_single_flight_shares_errors_and_releases_key():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    outcomes = []
+
+    def failing():
+        started.set()
+        release.wait()
+        raise RuntimeError("falhou")
+
+    def call(fn):
+        try:
+            outcomes.append(flight.do("k", fn))
+        except RuntimeError as e:
+            outcomes.append(str(e))
+
+    leader = threading.Thread(target=call, args=(failing,))
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call, args=(lambda: pytest.fail("executou de novo"),))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert outcomes == ["falhou", "falhou"]
+    assert flight.do("k", lambda: "ok") == ("ok", False)
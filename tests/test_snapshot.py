@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import snapshot
+
+KEY = {"zip_hash": "zip", "code_version": "codigo"}
+LOCAL = "Qual o fornecedor que teve maior montante recebido?"
+LLM = "Qual a natureza da operação mais comum entre as notas?"
+
+
+def new_agent(**provider_options):
+    import agente
+    from llm_provider import FakeProvider
+
+    provider = FakeProvider(**provider_options) if provider_options else agente.llm_provider
+    return agente.NFAnalysisAgent(provider)
+
+
+@pytest.fixture
+def saved(agent, tmp_path):
+    agent.answer(LOCAL)
+    agent.answer(LLM)
+    directory = str(tmp_path / "snapshot")
+    snapshot.save_snapshot(agent, directory, KEY)
+    return directory
+
+
+def test_round_trip(agent, saved):
+    restored = new_agent()
+    assert restored.load_snapshot(saved, KEY)
+    assert restored.is_ready
+
+    for name in snapshot.FRAMES:
+        original, copy = getattr(agent, name), getattr(restored, name)
+        assert original.equals(copy)
+        assert (original.dtypes == copy.dtypes).all()
+    assert restored.data_version == agent.data_version
+    assert restored.validation_report == agent.validation_report
+
+    for question in (LOCAL, LLM):
+        result = restored.answer(question)
+        assert result["cached"]
+        assert result["response"] == agent.answer(question)["response"]
+    assert restored.answer("Quais os 5 estados com mais notas?")["response"] == \
+        agent.answer("Quais os 5 estados com mais notas?")["response"]
+
+
+@pytest.mark.parametrize("changed", ["zip_hash", "code_version"])
+def test_key_mismatch_falls_back(saved, changed):
+    restored = new_agent()
+    assert not restored.load_snapshot(saved, dict(KEY, **{changed: "outro"}))
+    assert not restored.is_ready
+
+
+def test_missing_manifest_falls_back(saved):
+    os.remove(os.path.join(saved, snapshot.MANIFEST))
+    assert not new_agent().load_snapshot(saved, KEY)
+
+
+def test_other_llm_drops_llm_answers(saved):
+    restored = new_agent(model="outro-modelo")
+    assert restored.load_snapshot(saved, KEY)
+    assert restored.answer(LOCAL)["cached"]
+    result = restored.answer(LLM)
+    assert not result["cached"]
+    assert result["source"] == "llm"
+
+
+def test_code_version_covers_llm_provider():
+    assert "llm_provider.py" in snapshot.CODE_FILES
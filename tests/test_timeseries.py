@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+from timeseries import (PeriodoInvalido, TimeIndex, build_rollups, detectar_periodo, formatar_intervalo,
+                        recortar_rollup)
+
+T = pd.Timestamp
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("Quantas notas foram emitidas no dia 15 de janeiro?", (T(2024, 1, 15), T(2024, 1, 16))),
+    ("Qual o total de notas até 5 de janeiro?", (None, T(2024, 1, 6))),
+    ("Quantas notas foram emitidas entre 5 e 10 de janeiro?", (T(2024, 1, 5), T(2024, 1, 11))),
+    ("Total de notas de 5 a 10 de março de 2023", (T(2023, 3, 5), T(2023, 3, 11))),
+    ("Notas desde 1º de fevereiro", (T(2024, 2, 1), None)),
+    ("Quantas notas em janeiro?", (T(2024, 1, 1), T(2024, 2, 1))),
+    ("Total em dezembro de 2023", (T(2023, 12, 1), T(2024, 1, 1))),
+    ("Notas entre 10/01/2024 e 12/01/2024", (T(2024, 1, 10), T(2024, 1, 13))),
+    ("Notas em 2024-01-15", (T(2024, 1, 15), T(2024, 1, 16))),
+    ("Notas após 15/01/2024", (T(2024, 1, 16), None)),
+    ("Notas antes de 15/01/2024", (None, T(2024, 1, 15))),
+    ("Top 5 fornecedores em janeiro", (T(2024, 1, 1), T(2024, 2, 1))),
+    ("Quais os 5 estados com mais notas?", None),
+])
+def test_detectar_periodo(question, expected):
+    assert detectar_periodo(question, 2024) == expected
+
+
+@pytest.mark.parametrize("question", [
+    "Qual o total de notas até 31/02/2024?",
+    "Quantas notas foram emitidas em 2024-13-01?",
+    "Quantas notas no dia 32 de janeiro?",
+    "Quantas notas foram emitidas no dia 15?",
+    "Quantas notas em 15/01?",
+    "Quantas notas no dia 15 do mês de janeiro?",
+])
+def test_detectar_periodo_rejects_unparsed_days(question):
+    with pytest.raises(PeriodoInvalido):
+        detectar_periodo(question, 2024)
+
+
+@pytest.mark.parametrize("question", [
+    "Quantas notas foram emitidas no dia 15 de janeiro?",
+    "Qual o total de notas até 5 de janeiro?",
+    "Quantas notas foram emitidas entre 5 e 10 de janeiro?",
+])
+def test_day_questions_not_answered_with_whole_month(agent, question):
+    assert "Entre 01/01/2024 e 31/01/2024" not in agent.answer(question)["response"]
+
+
+def test_invalid_date_goes_to_llm(agent):
+    question = "Quais os 5 estados com mais notas até 31/02/2024?"
+    assert agent.resolve_intent(question) is None
+    assert agent.answer(question)["source"] == "llm"
+
+
+def test_time_index_slice():
+    datas = pd.Series([T(2024, 1, 3), pd.NaT, T(2024, 1, 1), T(2024, 1, 2, 23, 59), T(2024, 1, 2)])
+    index = TimeIndex(datas)
+    assert index.inicio == T(2024, 1, 1) and index.fim == T(2024, 1, 3)
+    assert list(index.slice(T(2024, 1, 2), T(2024, 1, 3))) == [4, 3]
+    assert list(index.slice(None, T(2024, 1, 2))) == [2]
+    assert list(index.slice(T(2024, 1, 3), None)) == [0]
+    assert list(index.slice(None, None)) == [2, 4, 3, 0]
+    assert len(index.slice(T(2025, 1, 1), None)) == 0
+
+
+def test_rollup_week_and_month_boundaries():
+    df = pd.DataFrame({
+        "DATA EMISSÃO": [T(2024, 1, 7, 23, 59), T(2024, 1, 8), T(2024, 1, 31, 23, 59), T(2024, 2, 1), pd.NaT],
+        "VALOR NOTA FISCAL": [1.0, 2.0, 4.0, 8.0, 16.0],
+        "UF EMITENTE": ["SP", "SP", "RJ", "SP", "SP"],
+        "RAZÃO SOCIAL EMITENTE": ["A", "B", "A", "A", "A"],
+    })
+    rollups = build_rollups(df)
+
+    # Semanas de segunda a domingo; notas sem data ficam de fora
+    semanas = rollups["semana"]["total"]
+    assert list(semanas.index) == [T(2024, 1, 1), T(2024, 1, 8), T(2024, 1, 29)]
+    assert list(semanas["valor"]) == [1.0, 2.0, 12.0]
+
+    meses = rollups["mes"]["total"]
+    assert list(meses.index) == [T(2024, 1, 1), T(2024, 2, 1)]
+    assert list(meses["notas"]) == [3, 1]
+    assert list(meses["valor"]) == [7.0, 8.0]
+    assert rollups["mes"]["uf"].loc[(T(2024, 1, 1), "SP"), "valor"] == 3.0
+
+    dias = recortar_rollup(rollups["dia"]["total"], T(2024, 1, 8), T(2024, 2, 1))
+    assert list(dias.index) == [T(2024, 1, 8), T(2024, 1, 31)]
+
+
+def test_formatar_intervalo():
+    assert formatar_intervalo(T(2024, 1, 15), T(2024, 1, 16)) == "Em 15/01/2024"
+    assert formatar_intervalo(None, T(2024, 1, 6)) == "Até 05/01/2024"
+    assert formatar_intervalo(T(2024, 1, 5), T(2024, 1, 11)) == "Entre 05/01/2024 e 10/01/2024"
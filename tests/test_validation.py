@@ -0,0 +1,54 @@
+import pandas as pd
+
+from validation import chaves_invalidas, cnpj_cpf_invalidos, codificar_chaves, validate
+
+CHAVE_OK = "41240106267630001509550010035101291224888487"
+
+
+def _frames(chaves_cab, itens):
+    cab = pd.DataFrame({
+        "CHAVE DE ACESSO": chaves_cab,
+        "CPF/CNPJ Emitente": "06267630001509",
+        "DATA EMISSÃO": "2024-01-18 07:10:39",
+        "VALOR NOTA FISCAL": 10.0,
+    })
+    df_itens = pd.DataFrame(itens, columns=["CHAVE DE ACESSO", "NÚMERO PRODUTO", "VALOR TOTAL"])
+    df_itens["QUANTIDADE"] = 1.0
+    df_itens["VALOR UNITÁRIO"] = df_itens["VALOR TOTAL"]
+    datas = cab["DATA EMISSÃO"]
+    cab["DATA EMISSÃO"] = pd.to_datetime(datas)
+    return cab, df_itens, datas
+
+
+def test_digitos_verificadores():
+    documentos = pd.Series(["06267630001509", "06267630001508", "52998224725", "11111111111", "***.165.104-**", None])
+    assert cnpj_cpf_invalidos(documentos).tolist() == [False, True, False, True, True, True]
+    chaves = pd.Series([CHAVE_OK, CHAVE_OK[:-1] + "0", CHAVE_OK[:-1], None])
+    assert chaves_invalidas(chaves).tolist() == [False, True, True, True]
+
+
+def test_chaves_orfas_duplicadas_e_totais():
+    outra = CHAVE_OK[:-1] + "0"
+    cab, itens, datas = _frames([CHAVE_OK, outra, CHAVE_OK],
+                                [(CHAVE_OK, 1, 4.0), (CHAVE_OK, 2, 6.0), ("orfa", 1, 1.0), (None, 1, 1.0)])
+    checks = validate(cab, itens, datas)["checks"]
+    assert checks["chaves_duplicadas"]["quantidade"] == 1
+    assert checks["notas_sem_itens"]["exemplos"] == [outra]
+    assert checks["itens_sem_nota"]["quantidade"] == 2
+    assert checks["total_nota_divergente"]["quantidade"] == 0
+    assert checks["itens_duplicados"]["quantidade"] == 0
+
+
+def test_itens_duplicados_fora_de_ordem():
+    cab, itens, datas = _frames([CHAVE_OK], [(CHAVE_OK, 2, 5.0), (CHAVE_OK, 1, 5.0), (CHAVE_OK, 2, 5.0)])
+    assert validate(cab, itens, datas)["checks"]["itens_duplicados"]["quantidade"] == 1
+
+
+def test_merge_por_codigos_igual_ao_merge_por_chave():
+    cab, itens, _ = _frames([CHAVE_OK, "b", CHAVE_OK], [(CHAVE_OK, 1, 4.0), ("b", 1, 2.0), ("c", 1, 1.0)])
+    codigos = codificar_chaves(cab["CHAVE DE ACESSO"], itens["CHAVE DE ACESSO"])
+    por_codigo = pd.merge(cab.assign(_codigo_nota=codigos[0]),
+                          itens.drop(columns="CHAVE DE ACESSO").assign(_codigo_nota=codigos[1]),
+                          on="_codigo_nota", how="inner", suffixes=("_cab", "_item")).drop(columns="_codigo_nota")
+    por_chave = pd.merge(cab, itens, on="CHAVE DE ACESSO", how="inner", suffixes=("_cab", "_item"))
+    pd.testing.assert_frame_equal(por_codigo, por_chave)
@@ -0,0 +1,299 @@
+"""
+ Nome do arquivo: timeseries.py
+ Autor: Alquimistas Digitais
+
+ Séries temporais sobre a DATA EMISSÃO das notas: agregados pré-calculados
+ (hora, dia, semana e mês) de quantidade e valor, com quebra por UF e por
+ fornecedor, um índice temporal ordenado para recortes por intervalo em
+ busca binária e a interpretação das perguntas: períodos, frequências, UF,
+ quantidade pedida e continuações ("e no Paraná?").
+
+ Importado apenas depois do carregamento dos dados (depende de pandas).
+"""
+
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+COLUNA_DATA = 'DATA EMISSÃO'
+COLUNA_VALOR = 'VALOR NOTA FISCAL'
+COLUNA_UF = 'UF EMITENTE'
+COLUNA_FORNECEDOR = 'RAZÃO SOCIAL EMITENTE'
+
+FREQUENCIAS = ("hora", "dia", "semana", "mes")
+
+NOMES_FREQUENCIA = {
+    "hora": "hora",
+    "dia": "dia",
+    "semana": "semana",
+    "mes": "mês",
+}
+
+# Expressões que pedem uma série temporal na frequência correspondente
+PADROES_FREQUENCIA = {
+    "hora": r"\bpor hora\b|\bhorari[oa]s?\b|\bcada hora\b",
+    "dia": r"\bpor dia\b|\bdiari[oa]s?\b|\bdia a dia\b|\bcada dia\b",
+    "semana": r"\bpor semana\b|\bsemana(l|is)\b|\bcada semana\b",
+    "mes": r"\bpor mes\b|\bmensa(l|is)\b|\bmes a mes\b|\bcada mes\b|\bpor meses\b",
+}
+
+MESES = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+
+_NOME_MES = "(" + "|".join(MESES) + ")"
+_DATA_BR = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+_DATA_ISO = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+# "entre 5 e 10 de janeiro", "de 5 a 10 de janeiro de 2024"
+_DIAS_MES = re.compile(r"\b(\d{1,2})o?\s+(?:e|a|ate)\s+(\d{1,2})o?\s+de\s+" + _NOME_MES + r"\b(?:\s+de\s+(\d{4}))?")
+# "15 de janeiro", "1o de marco de 2024"
+_DIA_MES = re.compile(r"\b(\d{1,2})o?\s+de\s+" + _NOME_MES + r"\b(?:\s+de\s+(\d{4}))?")
+_MES = re.compile(r"\b" + _NOME_MES + r"\b(?:\s+de\s+(\d{4}))?")
+# Dias que sobraram sem interpretação ("dia 15", "15/01", "15 do mes de janeiro")
+_DIA_SOLTO = re.compile(r"\bdias?\s+\d{1,2}\b|\b\d{1,2}/\d{1,2}\b|"
+                        r"\b\d{1,2}o?\s+(?:(?:de|do|da|a|e|ate|mes)\s+)+" + _NOME_MES + r"\b")
+
+UFS = ("AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA",
+       "PB", "PE", "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO")
+
+# Nomes sem acento; os mais longos primeiro ("mato grosso do sul" antes de "mato grosso")
+NOMES_UF = {
+    "rio grande do norte": "RN", "rio grande do sul": "RS", "mato grosso do sul": "MS",
+    "distrito federal": "DF", "espirito santo": "ES", "rio de janeiro": "RJ",
+    "santa catarina": "SC", "minas gerais": "MG", "mato grosso": "MT", "sao paulo": "SP",
+    "pernambuco": "PE", "tocantins": "TO", "rondonia": "RO", "amazonas": "AM", "maranhao": "MA",
+    "paraiba": "PB", "brasilia": "DF", "alagoas": "AL", "sergipe": "SE", "roraima": "RR",
+    "parana": "PR", "piaui": "PI", "amapa": "AP", "bahia": "BA", "ceara": "CE", "goias": "GO",
+    "minas": "MG", "acre": "AC",
+}
+
+_NOMES_UF = re.compile(r"\b(" + "|".join(NOMES_UF) + r")\b")
+_SIGLA_UF = re.compile(r"\b(" + "|".join(UFS) + r")\b")
+# "Pará" só com acento, para não confundir com a preposição "para"
+_PARA = re.compile(r"\bpará\b", re.IGNORECASE)
+_LIMITE = re.compile(r"\btop\s*(\d{1,3})\b|"
+                     r"\b(\d{1,3})\s+(?:primeir|maior|principa|mais|fornecedor|produto|estado|nota)")
+
+# Pedidos de contagem/total de notas no período ("quantas notas", "valor total")
+_PEDE_TOTAIS = re.compile(r"\b(quantas notas|quantidade de notas|numero de notas|total de notas|total das notas|"
+                          r"valor total|montante total|total emitido|quantas foram emitidas|quanto foi emitido)\b")
+_OUTRAS_METRICAS = re.compile(r"\b(medi[oa]s?|menor|menores|maior|maiores|itens|item|produtos?)\b")
+
+_INICIO_CONTINUACAO = ("e ", "e,", "agora ", "mas ", "so ", "somente ", "apenas ", "e quanto", "e se ")
+
+
+def remover_acentos(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def _buckets(datas: pd.Series) -> Dict[str, pd.Series]:
+    """Início do período de cada data, por frequência"""
+    return {
+        "hora": datas.dt.floor("h"),
+        "dia": datas.dt.normalize(),
+        "semana": datas.dt.to_period("W-SUN").dt.start_time,
+        "mes": datas.dt.to_period("M").dt.start_time,
+    }
+
+
+def build_rollups(df_cabecalho: pd.DataFrame) -> Dict[str, Dict[str, pd.DataFrame]]:
+    """
+    Agrega quantidade de notas e valor por período. Retorna
+    rollups[frequencia][quebra] com quebra em "total", "uf" e "fornecedor";
+    o índice é o início do período (e a UF ou o fornecedor, nas quebras).
+    """
+    df = df_cabecalho.loc[df_cabecalho[COLUNA_DATA].notna(), [COLUNA_DATA, COLUNA_VALOR, COLUNA_UF, COLUNA_FORNECEDOR]]
+    rollups = {}
+    for frequencia, periodo in _buckets(df[COLUNA_DATA]).items():
+        agrupado = df.assign(periodo=periodo)
+        rollups[frequencia] = {
+            "total": agrupado.groupby("periodo").agg(notas=(COLUNA_VALOR, "size"), valor=(COLUNA_VALOR, "sum")),
+            "uf": agrupado.groupby(["periodo", COLUNA_UF]).agg(notas=(COLUNA_VALOR, "size"), valor=(COLUNA_VALOR, "sum")),
+            "fornecedor": agrupado.groupby(["periodo", COLUNA_FORNECEDOR]).agg(notas=(COLUNA_VALOR, "size"), valor=(COLUNA_VALOR, "sum")),
+        }
+    return rollups
+
+
+class TimeIndex:
+
+    """Índice ordenado pela data de emissão para recortes por intervalo em O(log n)"""
+
+    def __init__(self, datas: pd.Series):
+        valores = datas.to_numpy(dtype="datetime64[ns]")
+        validos = ~np.isnat(valores)
+        posicoes = np.flatnonzero(validos)
+        ordem = np.argsort(valores[validos], kind="stable")
+        self.valores = valores[validos][ordem]
+        self.posicoes = posicoes[ordem]
+
+    @property
+    def inicio(self) -> Optional[pd.Timestamp]:
+        return pd.Timestamp(self.valores[0]) if len(self.valores) else None
+
+    @property
+    def fim(self) -> Optional[pd.Timestamp]:
+        return pd.Timestamp(self.valores[-1]) if len(self.valores) else None
+
+    def slice(self, inicio: Optional[pd.Timestamp], fim: Optional[pd.Timestamp]) -> np.ndarray:
+        """Posições (iloc) das linhas com inicio <= data < fim"""
+        lo = 0 if inicio is None else np.searchsorted(self.valores, np.datetime64(inicio, "ns"), side="left")
+        hi = len(self.valores) if fim is None else np.searchsorted(self.valores, np.datetime64(fim, "ns"), side="left")
+        return self.posicoes[lo:hi]
+
+
+def detectar_frequencia(pergunta: str) -> Optional[str]:
+    """Frequência pedida na pergunta ("hora", "dia", "semana", "mes") ou None"""
+    texto = remover_acentos(pergunta)
+    for frequencia, padrao in PADROES_FREQUENCIA.items():
+        if re.search(padrao, texto):
+            return frequencia
+    return None
+
+
+class PeriodoInvalido(ValueError):
+    """A pergunta cita uma data que não existe ou que não foi possível interpretar"""
+
+
+def _dia(ano: int, mes: int, dia: int) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Intervalo [inicio, fim) de um dia do calendário"""
+    try:
+        inicio = pd.Timestamp(ano, mes, dia)
+    except ValueError as e:
+        raise PeriodoInvalido(f"data inválida: {dia:02d}/{mes:02d}/{ano}") from e
+    return inicio, inicio + pd.Timedelta(days=1)
+
+
+def detectar_periodo(pergunta: str, ano_padrao: int) -> Optional[Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]]:
+    """
+    Intervalo [inicio, fim) citado na pergunta. Entende datas dd/mm/aaaa e
+    aaaa-mm-dd, "15 de janeiro", "entre 5 e 10 de janeiro", nomes de meses,
+    "entre X e Y", "desde X" e "até X". Retorna None se a pergunta não cita
+    datas; levanta PeriodoInvalido se cita uma data inexistente ("31/02/2024")
+    ou um dia que não foi possível interpretar, para que a pergunta não seja
+    respondida com o período errado.
+    """
+    texto = remover_acentos(pergunta)
+    datas = []
+    usados = []
+
+    def registrar(match, *intervalos):
+        usados.append(match.span())
+        for posicao, (inicio, fim) in intervalos:
+            datas.append((posicao, inicio, fim))
+
+    def livre(match) -> bool:
+        return all(match.end() <= inicio or match.start() >= fim for inicio, fim in usados)
+
+    for match in _DATA_BR.finditer(texto):
+        dia, mes, ano = (int(g) for g in match.groups())
+        registrar(match, (match.start(), _dia(ano, mes, dia)))
+    for match in _DATA_ISO.finditer(texto):
+        ano, mes, dia = (int(g) for g in match.groups())
+        registrar(match, (match.start(), _dia(ano, mes, dia)))
+    for match in _DIAS_MES.finditer(texto):
+        if livre(match):
+            ano, mes = int(match.group(4) or ano_padrao), MESES[match.group(3)]
+            registrar(match, (match.start(1), _dia(ano, mes, int(match.group(1)))),
+                      (match.start(2), _dia(ano, mes, int(match.group(2)))))
+    for match in _DIA_MES.finditer(texto):
+        if livre(match):
+            ano, mes = int(match.group(3) or ano_padrao), MESES[match.group(2)]
+            registrar(match, (match.start(), _dia(ano, mes, int(match.group(1)))))
+
+    # Dias citados fora dos formatos acima iriam virar o mês inteiro
+    restante = "".join(" " if any(inicio <= i < fim for inicio, fim in usados) else c for i, c in enumerate(texto))
+    if _DIA_SOLTO.search(restante):
+        raise PeriodoInvalido(f"dia não interpretado em: {pergunta}")
+
+    if not datas:
+        for match in _MES.finditer(texto):
+            inicio = pd.Timestamp(int(match.group(2) or ano_padrao), MESES[match.group(1)], 1)
+            datas.append((match.start(), inicio, inicio + pd.offsets.MonthBegin(1)))
+    if not datas:
+        return None
+
+    datas.sort(key=lambda d: d[0])
+    posicao, inicio, fim = datas[0]
+    if len(datas) > 1:
+        return inicio, datas[-1][2]
+
+    antes = texto[:posicao]
+    if re.search(r"(desde|a partir d[eo]a?)\s*$", antes):
+        return inicio, None
+    if re.search(r"apos\s*$", antes):
+        return fim, None
+    if re.search(r"ate\s*$", antes):
+        return None, fim
+    if re.search(r"antes d[eo]a?\s*$", antes):
+        return None, inicio
+    return inicio, fim
+
+
+def pede_totais(pergunta: str) -> bool:
+    """Pergunta pede só a quantidade e o valor total de notas (sem médias, extremos ou itens)"""
+    texto = remover_acentos(pergunta)
+    return bool(_PEDE_TOTAIS.search(texto)) and not _OUTRAS_METRICAS.search(texto)
+
+
+def detectar_uf(pergunta: str) -> Optional[str]:
+    """UF citada pelo nome (qualquer caixa) ou pela sigla em maiúsculas"""
+    if _PARA.search(pergunta):
+        return "PA"
+    match = _NOMES_UF.search(remover_acentos(pergunta))
+    if match:
+        return NOMES_UF[match.group(1)]
+    match = _SIGLA_UF.search(pergunta)
+    return match.group(1) if match else None
+
+
+def detectar_limite(pergunta: str) -> Optional[int]:
+    """Quantidade pedida ("top 5", "os 3 primeiros", "10 maiores")"""
+    match = _LIMITE.search(remover_acentos(pergunta))
+    if not match:
+        return None
+    limite = int(match.group(1) or match.group(2))
+    return limite if limite > 0 else None
+
+
+def eh_continuacao(pergunta: str, tem_filtro: bool) -> bool:
+    """Pergunta que depende da anterior: começa com "e ...", "agora ..." ou é curta e só traz um filtro"""
+    texto = " ".join(remover_acentos(pergunta).split())
+    if texto.startswith(_INICIO_CONTINUACAO):
+        return True
+    return tem_filtro and len(texto.split()) <= 4
+
+
+def recortar_rollup(rollup: pd.DataFrame, inicio: Optional[pd.Timestamp], fim: Optional[pd.Timestamp]) -> pd.DataFrame:
+    """Linhas do rollup com inicio <= período < fim (o índice já vem ordenado do groupby)"""
+    periodos = rollup.index.get_level_values(0)
+    lo = 0 if inicio is None else periodos.searchsorted(inicio, side="left")
+    hi = len(periodos) if fim is None else periodos.searchsorted(fim, side="left")
+    return rollup.iloc[lo:hi]
+
+
+def formatar_periodo(periodo: pd.Timestamp, frequencia: str) -> str:
+    if frequencia == "hora":
+        return periodo.strftime("%d/%m/%Y %Hh")
+    if frequencia == "semana":
+        return "semana de " + periodo.strftime("%d/%m/%Y")
+    if frequencia == "mes":
+        return periodo.strftime("%m/%Y")
+    return periodo.strftime("%d/%m/%Y")
+
+
+def formatar_intervalo(inicio: Optional[pd.Timestamp], fim: Optional[pd.Timestamp]) -> str:
+    """Descrição do intervalo [inicio, fim) em dias (fim exclusivo)"""
+    if fim is not None:
+        ultimo_dia = (fim - pd.Timedelta(microseconds=1)).strftime("%d/%m/%Y")
+    if inicio is None:
+        return f"Até {ultimo_dia}"
+    if fim is None:
+        return f"Desde {inicio.strftime('%d/%m/%Y')}"
+    if inicio.strftime("%d/%m/%Y") == ultimo_dia:
+        return f"Em {ultimo_dia}"
+    return f"Entre {inicio.strftime('%d/%m/%Y')} e {ultimo_dia}"
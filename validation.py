@@ -0,0 +1,262 @@
+"""
+ Nome do arquivo: validation.py
+ Autor: Alquimistas Digitais
+
+ Validação de consistência dos dados, executada durante o carregamento.
+ Todas as verificações são vetorizadas (pandas/numpy), sem laços por linha:
+
+   - chaves órfãs (cabeçalho sem itens e itens sem cabeçalho)
+   - chaves duplicadas
+   - soma dos itens diferente do VALOR NOTA FISCAL
+   - QUANTIDADE * VALOR UNITÁRIO diferente do VALOR TOTAL do item
+   - CPF/CNPJ do emitente e chave de acesso com dígito verificador inválido
+   - datas de emissão inválidas ou futuras
+
+ Importado apenas depois do carregamento dos dados (depende de pandas).
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+COLUNA_CHAVE = 'CHAVE DE ACESSO'
+COLUNA_CNPJ = 'CPF/CNPJ Emitente'
+COLUNA_DATA = 'DATA EMISSÃO'
+
+MAX_EXEMPLOS = 5
+
+# Tolerâncias para comparação de valores monetários
+TOLERANCIA_ABSOLUTA = 0.01
+TOLERANCIA_RELATIVA = 1e-3
+
+# Pesos em float32: os produtos escalares dos DVs viram multiplicações de
+# matriz (BLAS), exatas para somas tão pequenas
+PESOS_CNPJ_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.float32)
+PESOS_CNPJ_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.float32)
+PESOS_CPF_1 = np.arange(10, 1, -1, dtype=np.float32)
+PESOS_CPF_2 = np.arange(11, 1, -1, dtype=np.float32)
+# Pesos da chave de acesso: 2 a 9 repetidos, da direita para a esquerda
+PESOS_CHAVE = np.resize(np.arange(2, 10, dtype=np.float32), 43)[::-1].copy()
+# Linhas por bloco nas verificações de dígitos
+BLOCO = 1 << 16
+
+
+def _matriz_bytes(valores: pd.Series, largura: int) -> np.ndarray:
+    """
+    Converte strings em um array de bytes ASCII de largura fixa (S{largura + 1})
+    sem laço Python; o byte extra detecta valores mais longos que `largura`.
+    """
+    valores = valores.fillna("").astype(str)
+    try:
+        return valores.to_numpy(dtype=f"S{largura + 1}")
+    except UnicodeEncodeError:
+        # Caracteres fora do ASCII nunca são dígitos; troca por "?" antes de converter
+        return valores.str.encode("ascii", "replace").to_numpy(dtype=f"S{largura + 1}")
+
+
+def _bytes(brutos: np.ndarray) -> np.ndarray:
+    """Visão (n, largura + 1) em uint8 do array de largura fixa, sem cópia"""
+    return brutos.view(np.uint8).reshape(len(brutos), brutos.dtype.itemsize)
+
+
+def _matriz_digitos(brutos: np.ndarray, largura: int):
+    """
+    Converte os valores em uma matriz (n, largura) de dígitos.
+    Retorna a matriz, o comprimento de cada valor e se todos os caracteres são dígitos.
+    """
+    bytes_ = _bytes(brutos)
+    comprimentos = np.strings.str_len(brutos)
+    # Em uint8, bytes abaixo de "0" dão a volta e ficam maiores que 9
+    somente_digitos = ((bytes_ - 48) <= 9).sum(axis=1, dtype=np.int32) == comprimentos
+    return bytes_[:, :largura].astype(np.float32) - 48, comprimentos, somente_digitos
+
+
+def _soma_ponderada(digitos: np.ndarray, pesos: np.ndarray) -> np.ndarray:
+    return (digitos[:, :len(pesos)] @ pesos).astype(np.int64)
+
+
+def _dv_modulo11(digitos: np.ndarray, pesos: np.ndarray) -> np.ndarray:
+    resto = _soma_ponderada(digitos, pesos) % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+
+def _em_blocos(funcao, brutos: np.ndarray) -> np.ndarray:
+    """Aplica a verificação em blocos de linhas, para as matrizes temporárias caberem no cache"""
+    return np.concatenate([funcao(brutos[i:i + BLOCO]) for i in range(0, len(brutos), BLOCO)] or
+                          [np.zeros(0, dtype=bool)])
+
+
+def _repetidos(bytes_: np.ndarray, tamanho: int) -> np.ndarray:
+    return (bytes_[:, 1:tamanho] == bytes_[:, :1]).all(axis=1)
+
+
+def _mascarados(brutos: np.ndarray) -> np.ndarray:
+    return np.strings.find(brutos, b"*") >= 0
+
+
+def _documentos_invalidos(brutos: np.ndarray) -> np.ndarray:
+    digitos, comprimentos, somente_digitos = _matriz_digitos(brutos, 14)
+    bytes_ = _bytes(brutos)
+
+    cnpj = somente_digitos & (comprimentos == 14)
+    cnpj_ok = (cnpj
+               & (_dv_modulo11(digitos, PESOS_CNPJ_1) == digitos[:, 12])
+               & (_dv_modulo11(digitos, PESOS_CNPJ_2) == digitos[:, 13])
+               & ~_repetidos(bytes_, 14))
+
+    cpf = somente_digitos & (comprimentos == 11)
+    dv1 = _soma_ponderada(digitos, PESOS_CPF_1) * 10 % 11 % 10
+    dv2 = _soma_ponderada(digitos, PESOS_CPF_2) * 10 % 11 % 10
+    cpf_ok = cpf & (dv1 == digitos[:, 9]) & (dv2 == digitos[:, 10]) & ~_repetidos(bytes_, 11)
+
+    return ~(cnpj_ok | cpf_ok)
+
+
+def cpf_mascarados(valores: pd.Series) -> np.ndarray:
+    """Máscara dos documentos anonimizados na fonte (ex.: ***.165.104-**)"""
+    return _mascarados(_matriz_bytes(valores, 14))
+
+
+def cnpj_cpf_invalidos(valores: pd.Series) -> np.ndarray:
+    """Máscara dos documentos que não são CNPJ (14) nem CPF (11) com dígitos verificadores válidos"""
+    return _em_blocos(_documentos_invalidos, _matriz_bytes(valores, 14))
+
+
+def _chaves_invalidas(brutos: np.ndarray) -> np.ndarray:
+    digitos, comprimentos, somente_digitos = _matriz_digitos(brutos, 44)
+    dv = _dv_modulo11(digitos, PESOS_CHAVE)
+    return ~(somente_digitos & (comprimentos == 44) & (dv == digitos[:, 43]))
+
+
+def chaves_invalidas(valores: pd.Series) -> np.ndarray:
+    """Máscara das chaves de acesso que não têm 44 dígitos com DV módulo 11 correto"""
+    return _em_blocos(_chaves_invalidas, _matriz_bytes(valores, 44))
+
+
+def codificar_chaves(chaves_cab: pd.Series, chaves_itens: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Códigos inteiros das chaves de acesso, com uma única passada de hash sobre
+    cabeçalho e itens juntos. O merge e todas as verificações usam esses
+    códigos em vez de comparar as strings de 44 caracteres de novo.
+    """
+    codigos, _ = pd.factorize(pd.concat([chaves_cab, chaves_itens], ignore_index=True), use_na_sentinel=False)
+    return codigos[:len(chaves_cab)], codigos[len(chaves_cab):]
+
+
+def _valores_divergentes(a: pd.Series, b: pd.Series) -> np.ndarray:
+    a = a.to_numpy(dtype=float)
+    b = b.to_numpy(dtype=float)
+    return ~np.isclose(a, b, rtol=TOLERANCIA_RELATIVA, atol=TOLERANCIA_ABSOLUTA, equal_nan=False)
+
+
+def _resultado(descricao: str, mascara: np.ndarray, chaves: pd.Series) -> Dict[str, Any]:
+    # Só as posições dos primeiros exemplos, sem filtrar a coluna inteira
+    posicoes = np.flatnonzero(mascara)[:MAX_EXEMPLOS]
+    exemplos: List[str] = chaves.iloc[posicoes].astype(str).tolist() if len(posicoes) else []
+    return {
+        "descricao": descricao,
+        "quantidade": int(np.count_nonzero(mascara)),
+        "exemplos": exemplos,
+    }
+
+
+def validate(df_cabecalho: pd.DataFrame, df_itens: pd.DataFrame, datas_originais: pd.Series,
+             codigos: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict[str, Any]:
+    """
+    Executa todas as verificações e retorna o relatório. `datas_originais`
+    é a coluna DATA EMISSÃO antes da conversão, para distinguir datas vazias
+    de datas mal formatadas; `codigos` são os de codificar_chaves, se já
+    calculados para o merge.
+    """
+    inicio = time.perf_counter()
+    chaves_cab = df_cabecalho[COLUNA_CHAVE]
+    chaves_itens = df_itens[COLUNA_CHAVE]
+
+    if codigos is None:
+        codigos = codificar_chaves(chaves_cab, chaves_itens)
+    codigos_cab, codigos_itens = codigos
+    total_codigos = int(max(codigos_cab.max(initial=-1), codigos_itens.max(initial=-1))) + 1
+
+    # Códigos presentes no cabeçalho; item com código fora dele é órfão
+    no_cabecalho = np.zeros(total_codigos, dtype=bool)
+    no_cabecalho[codigos_cab] = True
+    orfaos = ~no_cabecalho[codigos_itens]
+    # factorize numera as chaves na ordem em que aparecem, começando pelo
+    # cabeçalho: a primeira ocorrência de uma nota é a que supera o maior código anterior
+    anteriores = np.maximum.accumulate(np.concatenate(([-1], codigos_cab[:-1]))) if len(codigos_cab) else codigos_cab
+    chaves_duplicadas = codigos_cab <= anteriores
+
+    # Soma e quantidade de itens por código, alinhadas ao cabeçalho
+    soma_itens = np.bincount(codigos_itens, weights=df_itens['VALOR TOTAL'].to_numpy(dtype=float),
+                             minlength=total_codigos)
+    qtd_itens = np.bincount(codigos_itens, minlength=total_codigos)
+    soma_por_nota = pd.Series(soma_itens[codigos_cab])
+    tem_itens = qtd_itens[codigos_cab] > 0
+
+    # Item duplicado: mesma nota e mesmo número de produto
+    numero_produto = pd.factorize(df_itens['NÚMERO PRODUTO'])[0].astype(np.int64)
+    chave_item = codigos_itens.astype(np.int64) * (int(numero_produto.max(initial=0)) + 2) + numero_produto + 1
+    if np.all(chave_item[1:] >= chave_item[:-1]):
+        # Itens na ordem do arquivo (nota e número crescentes): o repetido é igual ao anterior
+        itens_duplicados = np.concatenate(([False], chave_item[1:] == chave_item[:-1]))
+    else:
+        itens_duplicados = pd.Series(chave_item).duplicated(keep="first").to_numpy()
+
+    datas = df_cabecalho[COLUNA_DATA]
+    data_invalida = (datas.isna() & datas_originais.notna()).to_numpy()
+    data_ausente = datas_originais.isna().to_numpy()
+    data_futura = (datas > pd.Timestamp.now()).to_numpy()
+
+    documentos = _matriz_bytes(df_cabecalho[COLUNA_CNPJ], 14)
+    mascarados = _mascarados(documentos)
+
+    checks = {
+        "notas_sem_itens": _resultado(
+            "Notas do cabeçalho sem nenhum item (descartadas no merge)",
+            ~tem_itens, chaves_cab),
+        "itens_sem_nota": _resultado(
+            "Itens cuja chave não existe no cabeçalho (descartados no merge)",
+            orfaos, chaves_itens),
+        "chaves_duplicadas": _resultado(
+            "Chaves de acesso repetidas no cabeçalho",
+            chaves_duplicadas, chaves_cab),
+        "itens_duplicados": _resultado(
+            "Itens repetidos (mesma chave e número de produto)",
+            itens_duplicados, chaves_itens),
+        "total_nota_divergente": _resultado(
+            "Soma do VALOR TOTAL dos itens diferente do VALOR NOTA FISCAL",
+            tem_itens & _valores_divergentes(soma_por_nota, df_cabecalho['VALOR NOTA FISCAL']), chaves_cab),
+        "total_item_divergente": _resultado(
+            "QUANTIDADE * VALOR UNITÁRIO diferente do VALOR TOTAL do item",
+            _valores_divergentes(df_itens['QUANTIDADE'] * df_itens['VALOR UNITÁRIO'], df_itens['VALOR TOTAL']),
+            chaves_itens),
+        "documento_emitente_invalido": _resultado(
+            "CPF/CNPJ do emitente mal formado ou com dígito verificador inválido",
+            _em_blocos(_documentos_invalidos, documentos) & ~mascarados, chaves_cab),
+        "chave_acesso_invalida": _resultado(
+            "Chave de acesso sem 44 dígitos ou com dígito verificador inválido",
+            chaves_invalidas(chaves_cab), chaves_cab),
+        "data_emissao_invalida": _resultado(
+            "DATA EMISSÃO ausente ou em formato inválido",
+            data_invalida | data_ausente, chaves_cab),
+        "data_emissao_futura": _resultado(
+            "DATA EMISSÃO no futuro",
+            data_futura, chaves_cab),
+    }
+
+    return {
+        "ok": all(check["quantidade"] == 0 for check in checks.values()),
+        "total_notas": int(len(df_cabecalho)),
+        "total_itens": int(len(df_itens)),
+        "problemas": sum(check["quantidade"] for check in checks.values()),
+        "checks": checks,
+        # Não são erros: CPFs de pessoas físicas vêm anonimizados nos dados abertos
+        "informativos": {
+            "documento_emitente_mascarado": _resultado(
+                "CPF do emitente anonimizado na fonte (não verificável)",
+                mascarados, chaves_cab),
+        },
+        "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }